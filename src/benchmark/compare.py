@@ -0,0 +1,65 @@
+"""Compares two json results of `benchmark.stages`, stage by stage, and
+exits with status 1 when a stage got slower than `--threshold` times its
+baseline best time, so it can gate a CI job.
+
+    python -m benchmark.compare baseline.json current.json --threshold 1.2
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def by_stage(data: dict) -> dict:
+    return {(result['stage'], result['strategy']): result for result in data['results']}
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    regressions = []
+
+    for key in sorted(baseline.keys() & current.keys()):
+        before = baseline[key]['best']
+        after = current[key]['best']
+        ratio = after / before if before else float('inf')
+        regressed = ratio > threshold
+
+        print(f'{key[0]:<12} {key[1]:<32} {before:.4f}s -> {after:.4f}s '
+              f'{ratio:6.2f}x{"  REGRESSION" if regressed else ""}')
+
+        if regressed:
+            regressions.append(key)
+
+    for key in sorted(baseline.keys() - current.keys()):
+        print(f'{key[0]:<12} {key[1]:<32} missing')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('baseline', type=str)
+    parser.add_argument('current', type=str)
+    parser.add_argument('--threshold', dest='threshold', type=float, default=1.2)
+
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    current = load(args.current)
+
+    if baseline['params'] != current['params']:
+        print('Warning: the results were run with different parameters')
+
+    regressions = compare(by_stage(baseline), by_stage(current), args.threshold)
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Compares the resident memory of HlaExon against the previous layout.
+
+The previous exon kept a `__dict__` and an own copy of its slice of the
+allele sequence. Each variant is built in a fresh process, so the RSS
+growth of one does not hide the other.
+
+    python -m benchmark.exon_memory --hlas 20000 --exons 8 --seq-len 3000
+"""
+
+import argparse
+import os
+import random
+import resource
+from multiprocessing import get_context
+
+from hla import HlaExon
+
+
+class DictHlaExon:
+    def __init__(self, range: range) -> None:
+        self.range = range
+        self.seq = ''
+        self.number = 0
+        self.phantom = False
+
+
+def rss() -> int:
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def build(variant: str, qt_hlas: int, qt_exons: int, seq_len: int, queue):
+    rng = random.Random(0)
+    exon_len = seq_len // (qt_exons * 2)
+    seqs = [''.join(rng.choices('acgt', k=seq_len)) for __ in range(qt_hlas)]
+
+    before = rss()
+    hlas = []
+
+    for seq in seqs:
+        exons = []
+
+        for i in range(qt_exons):
+            start = i * exon_len * 2
+
+            if variant == 'compact':
+                exon = HlaExon(range(start, start + exon_len))
+                exon.number = i + 1
+                exon.seq = seq
+            else:
+                exon = DictHlaExon(range(start, start + exon_len))
+                exon.number = i + 1
+                exon.seq = seq[start:start + exon_len]
+
+            exons.append(exon)
+
+        hlas.append(exons)
+
+    queue.put(rss() - before)
+
+
+def measure(variant: str, qt_hlas: int, qt_exons: int, seq_len: int) -> int:
+    context = get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(
+        target=build, args=(variant, qt_hlas, qt_exons, seq_len, queue)
+    )
+
+    process.start()
+    result = queue.get()
+    process.join()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--hlas', dest='qt_hlas', type=int, default=20000)
+    parser.add_argument('--exons', dest='qt_exons', type=int, default=8)
+    parser.add_argument('--seq-len', dest='seq_len', type=int, default=3000)
+
+    args = parser.parse_args()
+
+    legacy = measure('dict', args.qt_hlas, args.qt_exons, args.seq_len)
+    compact = measure('compact', args.qt_hlas, args.qt_exons, args.seq_len)
+
+    print(f'exons:   {args.qt_hlas * args.qt_exons}')
+    print(f'dict:    {legacy / 2 ** 20:.1f} MiB')
+    print(f'compact: {compact / 2 ** 20:.1f} MiB')
+    print(f'saved:   {(1 - compact / legacy) * 100:.1f}%')
+
+
+if __name__ == '__main__':
+    main()
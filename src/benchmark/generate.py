@@ -0,0 +1,167 @@
+"""Generates synthetic dat, fasta and imgt files shaped like the IMGT/HLA
+release files, for benchmarks that can not ship the real data.
+
+Records carry the fields the parsers read plus the usual EMBL noise, and
+a share of them hit the cases the parsers special-case: comment lines with
+short lowercase words ahead of the sequence, exons missing from the
+numbering, records without any exon and a short last sequence line.
+
+    python -m benchmark.generate --out /tmp/hla --hlas 20000 --seq-len 3000
+"""
+
+import argparse
+import os
+import random
+from typing import List
+
+LOCI = ['HLA-A', 'HLA-B', 'HLA-C', 'HLA-DRB1', 'HLA-DQB1', 'HLA-DPB1', 'MICA',
+        'TAP1', 'HLA-DRB3', 'HLA-V', 'HLA-H', 'KIR']
+
+DAT_FILE = 'hla.dat'
+FASTA_FILE = 'hla_gen.fasta'
+IMGT_FILE = 'base.imgt'
+
+SHORT_CHUNKS_RATE = 0.1
+MISSING_EXONS_RATE = 0.15
+NO_EXONS_RATE = 0.01
+IMGT_RATE = 0.5
+
+
+def generate(out_dir: str, qt_hlas: int = 20000, loci: List[str] = LOCI, max_exons: int = 8,
+             seq_len: int = 3000, seed: int = 0) -> dict:
+    """Writes the dat, fasta and imgt files to `out_dir` and returns their
+    paths. The same arguments always produce the same files.
+    """
+
+    rng = random.Random(seed)
+    paths = {
+        'dat': os.path.join(out_dir, DAT_FILE),
+        'fasta': os.path.join(out_dir, FASTA_FILE),
+        'imgt': os.path.join(out_dir, IMGT_FILE)
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    with open(paths['dat'], 'w') as dat, open(paths['fasta'], 'w') as fasta, \
+            open(paths['imgt'], 'w') as imgt:
+        for i in range(qt_hlas):
+            id = f'HLA{i:05d}'
+            locus = rng.choice(loci)
+            name = f'{locus}*{rng.randint(1, 99):02d}:{rng.randint(1, 99):02d}:{i % 100:02d}'
+            seq = ''.join(rng.choices('acgt', k=rng.randint(seq_len // 2, seq_len * 3 // 2)))
+            exons = generate_exons(rng, len(seq), max_exons)
+
+            dat.write(format_dat(rng, id, name, seq, exons))
+            fasta.write(format_fasta(id, name, seq))
+
+            if exons and rng.random() < IMGT_RATE:
+                imgt.write(format_imgt(rng, name, exons))
+
+    return paths
+
+
+def generate_exons(rng: random.Random, seq_len: int, max_exons: int) -> List[tuple]:
+    if rng.random() < NO_EXONS_RATE:
+        return []
+
+    numbers = list(range(1, rng.randint(1, max_exons) + 1))
+
+    if len(numbers) > 2 and rng.random() < MISSING_EXONS_RATE:
+        numbers = numbers[1:-1]
+
+    slot = seq_len // len(numbers)
+    exons = []
+
+    for i, number in enumerate(numbers):
+        start = i * slot + rng.randint(0, slot // 4)
+        stop = start + rng.randint(max(1, slot // 4), max(1, slot // 2))
+        exons.append((start + 1, stop, number))
+
+    return exons
+
+
+def format_dat(rng: random.Random, id: str, name: str, seq: str, exons: List[tuple]) -> str:
+    lines = [
+        f'ID   {id}; SV 1; standard; DNA; HUM; {len(seq)} BP.',
+        'XX',
+        f'AC   {id};',
+        'XX',
+        'DT   19/11/2002 (Release 2.0.0)',
+        'XX',
+        f'DE   {name}, Human MHC sequence',
+        'XX',
+        'KW   HLA; Histocompatibility Antigen.',
+        'XX',
+        'OS   Homo sapiens (human)',
+        'OC   Eukaryota; Metazoa; Chordata; Vertebrata; Mammalia; Primates.',
+        'XX'
+    ]
+
+    if rng.random() < SHORT_CHUNKS_RATE:
+        lines += ['CC   cat gat a cgt sequenced from tag', 'XX']
+
+    lines += [
+        'FH   Key             Location/Qualifiers',
+        'FH',
+        f'FT   source          1..{len(seq)}'
+    ]
+
+    for start, stop, number in exons:
+        lines += [
+            f'FT   exon            {start}..{stop}',
+            f'FT                   /number="{number}"'
+        ]
+
+    counts = ' '.join(f'{seq.count(base)} {base.upper()};' for base in 'acgt')
+    lines += ['XX', f'SQ   Sequence {len(seq)} BP; {counts} 0 other;']
+
+    for i in range(0, len(seq), 60):
+        line = seq[i:i + 60]
+        chunks = ' '.join(line[j:j + 10] for j in range(0, len(line), 10))
+        lines.append(f'     {chunks:<66}{min(i + 60, len(seq)):>10}')
+
+    lines.append('//\n')
+
+    return '\n'.join(lines)
+
+
+def format_fasta(id: str, name: str, seq: str) -> str:
+    seq = seq.upper()
+    lines = [f'>HLA:{id} {name.replace("HLA-", "")} {len(seq)} bp']
+    lines += [seq[i:i + 60] for i in range(0, len(seq), 60)]
+
+    return '\n'.join(lines) + '\n'
+
+
+def format_imgt(rng: random.Random, name: str, exons: List[tuple]) -> str:
+    lines = [f'#{name}']
+
+    for start, stop, number in exons:
+        exon_seq = ''.join(rng.choices('ACGTN', weights=[24, 24, 24, 24, 4], k=stop - start + 1))
+        lines.append(f'>EX{number}')
+        lines += [exon_seq[i:i + 60] for i in range(0, len(exon_seq), 60)]
+
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--out', dest='out_dir', type=str, required=True)
+    parser.add_argument('--hlas', dest='qt_hlas', type=int, default=20000)
+    parser.add_argument('--loci', dest='loci', type=str, default=','.join(LOCI))
+    parser.add_argument('--exons', dest='max_exons', type=int, default=8)
+    parser.add_argument('--seq-len', dest='seq_len', type=int, default=3000)
+    parser.add_argument('--seed', dest='seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    paths = generate(args.out_dir, args.qt_hlas, args.loci.split(','), args.max_exons,
+                     args.seq_len, args.seed)
+
+    for path in paths.values():
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Times every stage of an extraction, for every registered strategy, over
+synthetic files from `benchmark.generate`, and saves the results as json.
+
+Stages are timed separately: reading the raw records, parsing them,
+grouping the alleles in collections, building the fasta and imgt indexes,
+the merges, which are idempotent and run on the same collections as in a
+`--fasta --from-imgt` run, and writing the imgt output. Every parser is
+timed up to the sequences of the alleles, and the stages after parsing
+run on the records and alleles of the default reader and parser. Each
+stage runs `--repeat` times over the same input, and the best and median
+times are kept.
+
+    python -m benchmark.stages --hlas 20000 --repeat 5 --json bench.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+from benchmark.generate import LOCI, generate
+from hla import HlaCollections, HlaStrParser, HlaWriter, StrHlaParser
+from hla_index import HlaFastaIndex, HlaImgtIndex
+from hla_merge import HlaFastaMerger, HlaImgtMerger
+from main import (reader_parser_strategies, reader_strategies, writer_parser_strategies,
+                  writer_strategies)
+
+VERSION = 1
+
+
+def measure(run: Callable, repeat: int, setup: Callable = None) -> dict:
+    times = []
+
+    for __ in range(repeat):
+        if setup:
+            setup()
+
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    return {'best': min(times), 'median': statistics.median(times), 'times': times}
+
+
+def read_contents(strategy, path: str) -> List[str]:
+    with open(path, 'r') as file:
+        return [content for content in strategy.iter_hla_contents(file) if content]
+
+
+def parse_contents(strategy, contents: List[str]) -> list:
+    parser = StrHlaParser(strategy)
+    hlas = []
+
+    for content in contents:
+        hla, valid = parser.parse(content)
+
+        if valid:
+            # Lazy parsers defer the sequence, which would leave it out of
+            # the time of the parse stage.
+            hla.seq
+            hlas.append(hla)
+
+    return hlas
+
+
+def group(hlas: list) -> HlaCollections:
+    hla_collections = HlaCollections()
+
+    for hla in hlas:
+        hla_collections.get_or_create(hla.type).add(hla)
+
+    return hla_collections
+
+
+def remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def run(paths: dict, repeat: int) -> List[dict]:
+    results = []
+
+    def add(stage: str, strategy: str, run: Callable, setup: Callable = None):
+        result = {'stage': stage, 'strategy': strategy, **measure(run, repeat, setup)}
+        results.append(result)
+        print(f'{stage:<12} {strategy:<32} {result["best"]:.4f}s')
+
+    for name, strategy in reader_strategies.items():
+        add('read', name, lambda: read_contents(strategy, paths['dat']))
+
+    contents = read_contents(reader_strategies['default'], paths['dat'])
+
+    for name, strategy in reader_parser_strategies.items():
+        add('parse', name, lambda: parse_contents(strategy, contents))
+
+    hlas = parse_contents(reader_parser_strategies['default'], contents)
+
+    add('group', 'default', lambda: group(hlas))
+
+    hla_collections = group(hlas)
+
+    fasta_index_path = HlaFastaIndex.path_for(paths['fasta'])
+    add('fasta_index', 'default', lambda: HlaFastaIndex.get(paths['fasta']),
+        lambda: remove(fasta_index_path))
+    add('fasta_merge', 'default', lambda: HlaFastaMerger(paths['fasta']).merge(hla_collections))
+
+    imgt_index_path = HlaImgtIndex.path_for(paths['imgt'])
+    add('imgt_index', 'default', lambda: HlaImgtIndex.get(paths['imgt']),
+        lambda: remove(imgt_index_path))
+    add('imgt_merge', 'default', lambda: HlaImgtMerger(paths['imgt']).merge(hla_collections))
+
+    imgt_path = os.path.join(os.path.dirname(paths['dat']), 'out.imgt')
+
+    for name, strategy in writer_strategies.items():
+        for parser_name, parser_strategy in writer_parser_strategies.items():
+            writer = HlaWriter(strategy, HlaStrParser(parser_strategy))
+            add('write', f'{name}/{parser_name}',
+                lambda: writer.write(imgt_path, hla_collections))
+
+    remove(imgt_path)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--hlas', dest='qt_hlas', type=int, default=20000)
+    parser.add_argument('--loci', dest='loci', type=str, default=','.join(LOCI))
+    parser.add_argument('--exons', dest='max_exons', type=int, default=8)
+    parser.add_argument('--seq-len', dest='seq_len', type=int, default=3000)
+    parser.add_argument('--seed', dest='seed', type=int, default=0)
+    parser.add_argument('--repeat', dest='repeat', type=int, default=3)
+    parser.add_argument('--json', dest='json_file', type=str)
+
+    args = parser.parse_args()
+    params = {
+        'hlas': args.qt_hlas,
+        'loci': args.loci.split(','),
+        'exons': args.max_exons,
+        'seq_len': args.seq_len,
+        'seed': args.seed,
+        'repeat': args.repeat
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = generate(tmp_dir, args.qt_hlas, params['loci'], args.max_exons,
+                         args.seq_len, args.seed)
+        results = run(paths, args.repeat)
+
+    if args.json_file:
+        with open(args.json_file, 'w') as file:
+            json.dump({
+                'version': VERSION,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'params': params,
+                'results': results
+            }, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
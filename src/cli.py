@@ -11,17 +11,46 @@ class Cli:
         parser.add_argument('--dat', dest='dat_file',
                             type=str, required=True)
         parser.add_argument('--imgt', dest='imgt_file',
-                            type=str, required=True)
+                            type=str)
+        parser.add_argument('--shards', dest='shards_dir',
+                            type=str)
         parser.add_argument('--fasta', dest='fasta_file',
                             type=str)
         parser.add_argument('--from-imgt', dest='from_imgt_file',
                             type=str)
 
+        parser.add_argument('--batch', dest='batch_file',
+                            type=str)
+
+        parser.add_argument('--loci', dest='loci',
+                            type=str)
+
         parser.add_argument('--normalize', dest='normalize',
                             action='store_true')
         parser.add_argument('--use-cds', dest='use_cds',
                             action='store_true')
 
+        parser.add_argument('--no-cache', dest='no_cache',
+                            action='store_true')
+        parser.add_argument('--cache-dir', dest='cache_dir',
+                            type=str)
+        parser.add_argument('--cache-size', dest='cache_size',
+                            type=int, default=1024)
+        parser.add_argument('--incremental', dest='incremental',
+                            action='store_true')
+        parser.add_argument('--low-memory', dest='low_memory',
+                            action='store_true')
+        parser.add_argument('--use-index', dest='use_index',
+                            action='store_true')
+        parser.add_argument('--workers', dest='workers',
+                            type=int, default=1)
+        parser.add_argument('--profile', dest='profile',
+                            action='store_true')
+        parser.add_argument('--metrics-json', dest='metrics_json',
+                            type=str)
+        parser.add_argument('--profile-dump', dest='profile_dump',
+                            type=str)
+
         parser.add_argument('--reader-strategy', dest='reader_strategy',
                             type=str, default='default')
         parser.add_argument('--writer-strategy', dest='writer_strategy',
@@ -37,12 +66,28 @@ class Cli:
 class Args:
     dat_file: str
     imgt_file: str
+    shards_dir: str
     fasta_file: str
     from_imgt_file: str
 
+    batch_file: str
+
+    loci: str
+
     normalize: bool
     use_cds: bool
 
+    no_cache: bool
+    cache_dir: str
+    cache_size: int
+    incremental: bool
+    low_memory: bool
+    use_index: bool
+    workers: int
+    profile: bool
+    metrics_json: str
+    profile_dump: str
+
     reader_strategy: str
     writer_strategy: str
     reader_parser_strategy: str
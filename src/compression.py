@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+from typing import Union
+
+CHUNK_SIZE = 1 << 20
+QUEUE_SIZE = 8
+
+COMPRESSIONS = (
+    (b'\x1f\x8b', gzip),
+    (b'BZh', bz2),
+    (b'\xfd7zXZ\x00', lzma)
+)
+
+
+def detect_compression(path: str):
+    with open(path, 'rb') as file:
+        magic = file.read(6)
+
+    for compression_magic, module in COMPRESSIONS:
+        if magic.startswith(compression_magic):
+            return module
+
+    return None
+
+
+def is_compressed(path: str) -> bool:
+    return detect_compression(path) is not None
+
+
+def open_text(path: str) -> io.TextIOBase:
+    """Opens `path` for reading as text, decompressing gzip, bz2 and xz
+    files, detected by their magic bytes, in a background thread.
+    """
+
+    module = detect_compression(path)
+
+    if not module:
+        return open(path, 'r')
+
+    stream = DecompressingStream(module.open(path, 'rb'))
+    return io.TextIOWrapper(io.BufferedReader(stream, CHUNK_SIZE))
+
+
+class DecompressingStream(io.RawIOBase):
+    """Raw stream fed by a thread reading a decompressing file object.
+
+    Decompressed chunks go through a bounded queue, so decompression runs
+    ahead of the consumer by at most `QUEUE_SIZE` chunks, overlapping with
+    the parsing instead of adding to it.
+    """
+
+    def __init__(self, source: io.BufferedIOBase) -> None:
+        super().__init__()
+
+        self.__source = source
+        self.__queue = queue.Queue(QUEUE_SIZE)
+        self.__stopped = threading.Event()
+        self.__pending = memoryview(b'')
+        self.__eof = False
+
+        self.__thread = threading.Thread(target=self.__decompress, daemon=True)
+        self.__thread.start()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self.__pending and not self.__eof:
+            chunk: Union[bytes, BaseException] = self.__queue.get()
+
+            if isinstance(chunk, BaseException):
+                self.__eof = True
+                raise chunk
+
+            if not chunk:
+                self.__eof = True
+
+            self.__pending = memoryview(chunk)
+
+        size = min(len(buffer), len(self.__pending))
+        buffer[:size] = self.__pending[:size]
+        self.__pending = self.__pending[size:]
+
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.__stopped.set()
+
+        while self.__thread.is_alive():
+            try:
+                self.__queue.get_nowait()
+            except queue.Empty:
+                self.__thread.join(0.01)
+
+        self.__source.close()
+        super().close()
+
+    def __decompress(self):
+        try:
+            while not self.__stopped.is_set():
+                chunk = self.__source.read(CHUNK_SIZE)
+                self.__queue.put(chunk)
+
+                if not chunk:
+                    break
+        except BaseException as error:
+            self.__queue.put(error)
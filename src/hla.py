@@ -1,41 +1,188 @@
 from __future__ import annotations
 
+import multiprocessing
+import os
+import shutil
+import typing
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
 from io import TextIOWrapper
-from typing import Tuple
+from itertools import islice
+from typing import Iterable, Iterator, Tuple, Union
 
-from super_collections import Dict, List, Set
+from compression import is_compressed, open_text
+from hla_index import HlaDatIndex, HlaDatIndexEntry
+from hla_metrics import HlaMetrics
+from super_collections import Dict, List, Set, SetFilterPredicate
 
 
 class HlaReader:
-    def __init__(self, strategy: HlaContentReaderStrategy, parser: StrHlaParser) -> None:
+    """Reads collections of alleles from files.
+
+    When `loci` or `names` are given, records of other loci or alleles are
+    skipped before being parsed, from the allele name the parser peeks at in
+    the raw record. When `metrics` is given, the read, filter and parse
+    stages are measured.
+    """
+
+    BATCH_SIZE = 256
+
+    def __init__(self, strategy: HlaContentReaderStrategy, parser: StrHlaParser, workers: int = 1,
+                 loci: Union[Iterable[str], None] = None, names: Union[Iterable[str], None] = None,
+                 metrics: Union[HlaMetrics, None] = None) -> None:
         self.__strategy = strategy
         self.__parser = parser
+        self.__workers = workers
+        self.__metrics = metrics
+        self.loci = loci
+        self.names = names
 
-    def read(self, path: str) -> Set[HlaCollection]:
-        hla_collections = Set[HlaCollection]()
+    def read(self, path: str, types: Union[Iterable[str], None] = None,
+             names: Union[Iterable[str], None] = None) -> HlaCollections:
+        if types is None and names is None:
+            return self.__group(self.iter_hlas(path))
 
-        with (open(path, 'r')) as file:
-            while True:
-                hla_content = self.get_hla_content(file)
+        if not is_compressed(path):
+            return self.read_indexed(path, types, names)
 
-                if not hla_content:
-                    break
+        types = set(types) if types is not None else None
+        names = set(names) if names is not None else None
 
-                hla, valid = self.parser.parse(hla_content)
+        return self.__group(
+            hla for hla in self.iter_hlas(path)
+            if (types is None or hla.type in types) and (names is None or hla.name in names)
+        )
 
-                if not valid:
-                    continue
+    def iter_hlas(self, path: str) -> Iterator[Hla]:
+        with (open_text(path)) as file:
+            yield from self.parse_hla_contents(self.iter_hla_contents(file))
+
+    def read_indexed(self, path: str, types: Union[Iterable[str], None] = None,
+                     names: Union[Iterable[str], None] = None) -> HlaCollections:
+        index = HlaDatIndex.get(path)
+        entries = index.find(types, names)
+
+        if self.loci is not None or self.names is not None:
+            entries = [
+                entry for entry in entries
+                if (self.loci is None or entry.type in self.loci)
+                and (self.names is None or entry.name in self.names)
+            ]
+
+        with (open(path, 'rb')) as file:
+            hla_contents = (self.__read_entry(file, entry) for entry in entries)
+            return self.__group(self.parse_hla_contents(hla_contents))
+
+    @staticmethod
+    def __read_entry(file, entry: HlaDatIndexEntry) -> str:
+        file.seek(entry.offset)
+        text = file.read(entry.length).decode()
+
+        if '\r' in text:
+            return text.replace('\r\n', '\n')
+
+        return HlaRecord(text, file.name, entry.offset)
+
+    @staticmethod
+    def __group(hlas: Iterable[Hla]) -> HlaCollections:
+        hla_collections = HlaCollections()
 
-                hla_collection = HlaCollection(hla.type)
-                hla_collection = hla_collections.add(hla_collection)
-                hla_collection.add(hla)
+        for hla in hlas:
+            hla_collections.get_or_create(hla.type).add(hla)
 
         return hla_collections
 
     def get_hla_content(self, file: TextIOWrapper) -> str:
         return self.strategy.get_hla_content(file)
 
+    def iter_hla_contents(self, file: TextIOWrapper) -> Iterator[str]:
+        return self.strategy.iter_hla_contents(file)
+
+    def parse_hla_contents(self, hla_contents: Iterable[str]) -> Iterator[Hla]:
+        metrics = self.metrics
+
+        if metrics is not None:
+            hla_contents = metrics.measure('read', hla_contents, len)
+
+        if self.loci is not None or self.names is not None:
+            hla_contents = self.__select(hla_contents)
+
+            if metrics is not None:
+                hla_contents = metrics.measure('filter', hla_contents)
+
+        if self.workers > 1:
+            hlas = self.__parse_hla_contents_parallel(hla_contents)
+        else:
+            hlas = self.__parse_hla_contents_serial(hla_contents)
+
+        if metrics is not None:
+            hlas = metrics.measure('parse', hlas)
+
+        yield from hlas
+
+    def __parse_hla_contents_serial(self, hla_contents: Iterable[str]) -> Iterator[Hla]:
+        for hla_content in hla_contents:
+            hla, valid = self.parser.parse(hla_content)
+
+            if valid:
+                yield hla
+            elif self.metrics is not None:
+                self.metrics.stage('parse').failed += 1
+
+    def __select(self, hla_contents: Iterable[str]) -> Iterator[str]:
+        loci = self.loci
+        names = self.names
+        peek_name = self.parser.peek_name
+
+        for hla_content in hla_contents:
+            name = peek_name(hla_content)
+
+            if name is not None:
+                if loci is not None and name.split('*')[0] not in loci:
+                    continue
+
+                if names is not None and name not in names:
+                    continue
+
+            yield hla_content
+
+    def __parse_hla_contents_parallel(self, hla_contents: Iterable[str]) -> Iterator[Hla]:
+        hla_contents = iter(hla_contents)
+        pending = deque()
+
+        # The readers of the mergers run in threads, so forking could copy a
+        # lock held by another one into the workers.
+        start_methods = multiprocessing.get_all_start_methods()
+        mp_context = multiprocessing.get_context(
+            'forkserver' if 'forkserver' in start_methods else 'spawn'
+        )
+
+        with ProcessPoolExecutor(self.workers, mp_context=mp_context) as executor:
+            while True:
+                while len(pending) < self.workers * 2:
+                    batch = list(islice(hla_contents, self.BATCH_SIZE))
+
+                    if not batch:
+                        break
+
+                    pending.append((len(batch), executor.submit(
+                        _parse_hla_contents_batch, self.parser, batch
+                    )))
+
+                if not pending:
+                    break
+
+                qt_hla_contents, future = pending.popleft()
+                result = future.result()
+
+                if self.metrics is not None:
+                    self.metrics.stage('parse').failed += qt_hla_contents - len(result)
+
+                for hla_data in result:
+                    yield Hla.from_tuple(hla_data)
+
     @property
     def strategy(self) -> HlaContentReaderStrategy:
         return self.__strategy
@@ -52,6 +199,50 @@ class HlaReader:
     def parser(self, parser: StrHlaParser):
         self.__parser = parser
 
+    @property
+    def workers(self) -> int:
+        return self.__workers
+
+    @workers.setter
+    def workers(self, workers: int):
+        self.__workers = workers
+
+    @property
+    def metrics(self) -> Union[HlaMetrics, None]:
+        return self.__metrics
+
+    @metrics.setter
+    def metrics(self, metrics: Union[HlaMetrics, None]):
+        self.__metrics = metrics
+
+    @property
+    def loci(self) -> Union[frozenset, None]:
+        return self.__loci
+
+    @loci.setter
+    def loci(self, loci: Union[Iterable[str], None]):
+        self.__loci = frozenset(loci) if loci is not None else None
+
+    @property
+    def names(self) -> Union[frozenset, None]:
+        return self.__names
+
+    @names.setter
+    def names(self, names: Union[Iterable[str], None]):
+        self.__names = frozenset(names) if names is not None else None
+
+
+def _parse_hla_contents_batch(parser: StrHlaParser, hla_contents: List[str]) -> List[tuple]:
+    result = List[tuple]()
+
+    for hla_content in hla_contents:
+        hla, valid = parser.parse(hla_content)
+
+        if valid:
+            result.append(hla.to_tuple())
+
+    return result
+
 
 class HlaContentReaderStrategy(ABC):
     @classmethod
@@ -59,21 +250,87 @@ class HlaContentReaderStrategy(ABC):
     def get_hla_content(cls, file: TextIOWrapper) -> str:
         pass
 
+    @classmethod
+    def iter_hla_contents(cls, file: TextIOWrapper) -> Iterator[str]:
+        while True:
+            hla_content = cls.get_hla_content(file)
+
+            if not hla_content:
+                break
+
+            yield hla_content
+
 
 class HlaWriter:
-    def __init__(self, strategy: HlaCollectionWriterStrategy, parser: HlaStrParser) -> None:
+    def __init__(self, strategy: HlaCollectionWriterStrategy, parser: HlaStrParser,
+                 metrics: Union[HlaMetrics, None] = None) -> None:
         self.__strategy = strategy
         self.__parser = parser
+        self.__metrics = metrics
 
     def write(self, path: str, hla_collections: Set[HlaCollection]):
-        with (open(path, 'w')) as file:
-            for hla_collection in hla_collections:
+        with self.measure() as stage, (open(path, 'w')) as file:
+            for hla_collection in self.strategy.order(hla_collections):
                 self.strategy.write_hla_collection(
                     file,
                     hla_collection,
                     self.parser
                 )
 
+                if stage:
+                    stage.records += len(hla_collection.hlas)
+
+            if stage:
+                stage.bytes += file.tell()
+
+    def write_shards(self, shards_dir: str, hla_collections: Set[HlaCollection],
+                     path: Union[str, None] = None, workers: Union[int, None] = None) -> List[str]:
+        os.makedirs(shards_dir, exist_ok=True)
+
+        hla_collections = sorted(hla_collections, key=lambda hla_collection: hla_collection.type)
+
+        with self.measure() as stage:
+            with ThreadPoolExecutor(workers) as executor:
+                shards = List[str](executor.map(
+                    lambda hla_collection: self.__write_shard(shards_dir, hla_collection),
+                    hla_collections
+                ))
+
+            if path:
+                self.concat_shards(path, shards)
+
+            if stage:
+                stage.records += sum(len(hla_collection.hlas) for hla_collection in hla_collections)
+                stage.bytes += sum(os.path.getsize(shard) for shard in shards)
+
+        return shards
+
+    def measure(self):
+        """Returns the `write` stage of the metrics to enter around a write,
+        or a null context without metrics.
+        """
+
+        return self.metrics.stage('write') if self.metrics is not None else nullcontext()
+
+    def __write_shard(self, shards_dir: str, hla_collection: HlaCollection) -> str:
+        shard = self.shard_path(shards_dir, hla_collection.type)
+
+        with (open(shard, 'w')) as file:
+            self.strategy.write_hla_collection(file, hla_collection, self.parser)
+
+        return shard
+
+    @staticmethod
+    def shard_path(shards_dir: str, type: str) -> str:
+        return os.path.join(shards_dir, f'{type}.imgt')
+
+    @staticmethod
+    def concat_shards(path: str, shards: Iterable[str]):
+        with (open(path, 'w')) as file:
+            for shard in shards:
+                with (open(shard, 'r')) as shard_file:
+                    shutil.copyfileobj(shard_file, file)
+
     @property
     def strategy(self) -> HlaCollectionWriterStrategy:
         return self.__strategy
@@ -90,6 +347,14 @@ class HlaWriter:
     def parser(self, parser: HlaStrParser):
         self.__parser = parser
 
+    @property
+    def metrics(self) -> Union[HlaMetrics, None]:
+        return self.__metrics
+
+    @metrics.setter
+    def metrics(self, metrics: Union[HlaMetrics, None]):
+        self.__metrics = metrics
+
 
 class HlaCollectionWriterStrategy(ABC):
     @classmethod
@@ -97,6 +362,10 @@ class HlaCollectionWriterStrategy(ABC):
     def write_hla_collection(cls, file: TextIOWrapper, hla_collection: HlaCollection, parser: HlaStrParser) -> str:
         pass
 
+    @classmethod
+    def order(cls, hla_collections: Iterable[HlaCollection]) -> Iterable[HlaCollection]:
+        return hla_collections
+
 
 class StrHlaParser:
     def __init__(self, strategy: StrHlaParserStrategy) -> None:
@@ -105,6 +374,15 @@ class StrHlaParser:
     def parse(self, text: str, *args, **kwargs) -> Tuple[Hla, bool]:
         return self.strategy.parse(text, *args, **kwargs)
 
+    def peek_name(self, text: str) -> Union[str, None]:
+        return self.strategy.peek_name(text)
+
+    def peek_type(self, text: str) -> Union[str, None]:
+        return self.strategy.peek_type(text)
+
+    def peek_id(self, text: str) -> Union[str, None]:
+        return self.strategy.peek_id(text)
+
     @property
     def strategy(self) -> StrHlaParserStrategy:
         return self.__strategy
@@ -120,6 +398,25 @@ class StrHlaParserStrategy(ABC):
     def parse(cls, text: str, *args, **kwargs) -> Tuple[Hla, bool]:
         pass
 
+    @classmethod
+    def peek_name(cls, text: str) -> Union[str, None]:
+        """Allele name of the raw record, read without parsing the rest of
+        it, or None when the strategy can not tell it cheaply.
+        """
+
+        return None
+
+    @classmethod
+    def peek_type(cls, text: str) -> Union[str, None]:
+        name = cls.peek_name(text)
+        return name.split('*')[0] if name is not None else None
+
+    @classmethod
+    def peek_id(cls, text: str) -> Union[str, None]:
+        """Allele id of the raw record, read as `peek_name`."""
+
+        return None
+
 
 class HlaStrParser:
     def __init__(self, strategy: HlaStrParserStrategy) -> None:
@@ -128,6 +425,13 @@ class HlaStrParser:
     def parse(self, hla: Hla, *args, **kwargs) -> str:
         return self.strategy.parse(hla, *args, **kwargs)
 
+    def parse_into(self, hla: Hla, pieces: list, *args, **kwargs):
+        self.strategy.parse_into(hla, pieces, *args, **kwargs)
+
+    def parse_exons_into(self, name: str, exon_seqs: Iterable[Union[str, None]], pieces: list,
+                         *args, **kwargs):
+        self.strategy.parse_exons_into(name, exon_seqs, pieces, *args, **kwargs)
+
     @property
     def strategy(self) -> HlaStrParserStrategy:
         return self.__strategy
@@ -143,6 +447,30 @@ class HlaStrParserStrategy(ABC):
     def parse(cls, hla: Hla, *args, **kwargs) -> str:
         pass
 
+    @classmethod
+    def parse_into(cls, hla: Hla, pieces: list, *args, **kwargs):
+        pieces.append(cls.parse(hla, *args, **kwargs))
+
+    @classmethod
+    def parse_exons_into(cls, name: str, exon_seqs: Iterable[Union[str, None]], pieces: list,
+                         *args, **kwargs):
+        """Parses an allele given only as its name and the sequence of every
+        exon number from 1, None for the missing ones, as the columnar
+        writer reads them. Strategies writing only those override it, the
+        others get an allele without id or sequence built from them.
+        """
+
+        hla = Hla('', name, '', List[HlaExon]())
+
+        for number, exon_seq in enumerate(exon_seqs, 1):
+            if exon_seq is not None:
+                exon = HlaExon(range(0, len(exon_seq)))
+                exon.number = number
+                exon.seq = exon_seq
+                hla.add_exon(exon)
+
+        cls.parse_into(hla, pieces, *args, **kwargs)
+
 
 class HlaCollection:
     def __init__(self, type: str) -> None:
@@ -161,11 +489,13 @@ class HlaCollection:
         return hash(self.type)
 
     def add(self, hla: Hla):
+        self.__hlas[hla.id] = hla
+        self.update_exons_max_len(hla)
+
+    def update_exons_max_len(self, hla: Hla):
         exons = hla.exons_full
         qt_exons = hla.last_exon_number
 
-        self.__hlas[hla.id] = hla
-
         if self.qt_exons == 0:
             self.__qt_exons = qt_exons
 
@@ -191,6 +521,21 @@ class HlaCollection:
             if new_exon_len > old_exon_len:
                 self.__exons_max_len[i] = new_exon_len
 
+    def derive(self, hlas: Dict[Hla]) -> HlaCollection:
+        """Returns a collection of the same locus holding `hlas`, keyed as
+        given, keeping the exons max lengths of this one, as alleles
+        replaced through `hlas` do not update them.
+        """
+
+        hla_collection = HlaCollection(self.type)
+
+        hla_collection.__hlas = hlas
+
+        hla_collection.__exons_max_len = List[int](self.exons_max_len)
+        hla_collection.__qt_exons = self.qt_exons
+
+        return hla_collection
+
     def config_exons_ranges_for_cds(self):
         for hla in self.__hlas.values():
             hla.config_exons_ranges_for_cds()
@@ -216,25 +561,138 @@ class HlaCollection:
         return self.__qt_exons
 
 
+class HlaCollections(Set[HlaCollection]):
+    """Set of collections keyed by locus type, with O(1) lookups."""
+
+    def __init__(self, hla_collections: Iterable[HlaCollection] = ()) -> None:
+        super().__init__()
+        self.__by_type = Dict[HlaCollection]()
+
+        for hla_collection in hla_collections:
+            self.add(hla_collection)
+
+    def add(self, hla_collection: HlaCollection) -> HlaCollection:
+        stored = self.__by_type.get(hla_collection.type)
+
+        if stored:
+            return stored
+
+        set.add(self, hla_collection)
+        self.__by_type[hla_collection.type] = hla_collection
+
+        return hla_collection
+
+    def get(self, type: str) -> Union[HlaCollection, None]:
+        return self.__by_type.get(type)
+
+    def get_or_create(self, type: str) -> HlaCollection:
+        hla_collection = self.__by_type.get(type)
+
+        if not hla_collection:
+            hla_collection = self.add(HlaCollection(type))
+
+        return hla_collection
+
+    def remove(self, hla_collection: HlaCollection):
+        set.remove(self, hla_collection)
+        del self.__by_type[hla_collection.type]
+
+    def discard(self, hla_collection: HlaCollection):
+        if hla_collection in self:
+            self.remove(hla_collection)
+
+    def clear(self):
+        set.clear(self)
+        self.__by_type.clear()
+
+    def filter(self, predicate: SetFilterPredicate[HlaCollection]) -> HlaCollections:
+        new_set = HlaCollections()
+
+        for i, v in enumerate(self):
+            if predicate(v, i, self):
+                new_set.add(v)
+
+        return new_set
+
+    @property
+    def types(self) -> List[str]:
+        return List[str](self.__by_type.keys())
+
+
 class Hla:
-    def __init__(self, id: str, name: str, seq: str, exons: List[HlaExon]) -> None:
+    """Allele parsed from a record. `seq` can be an HlaLazySeq, joined the
+    first time the sequence of the allele or of one of its exons is read.
+    """
+
+    def __init__(self, id: str, name: str, seq: Union[str, HlaLazySeq], exons: List[HlaExon]) -> None:
         self.__id = id
         self.__name = name
         self.__seq = seq
         self.__exons = exons
         self.__exons_ranges = List[range]()
+        self.__exons_by_number = None
+        self.__exons_full = None
+        self.__last_exon_number = None
+
+    def to_tuple(self) -> tuple:
+        exons = [(exon.range.start, exon.range.stop, exon.number) for exon in self.__exons]
+        return self.id, self.name, self.seq, exons
+
+    @classmethod
+    def from_tuple(cls, data: tuple) -> Hla:
+        id, name, seq, exons_data = data
+        exons = List[HlaExon]()
+
+        for exon_start, exon_stop, exon_number in exons_data:
+            exon = HlaExon(range(exon_start, exon_stop))
+
+            exon.number = exon_number
+            exon.seq = seq
+
+            exons.append(exon)
+
+        return cls(id, name, seq, exons)
+
+    def copy(self) -> Hla:
+        """Returns an allele sharing the sequences of this one, with its own
+        exons, so their ranges and sequences can change independently.
+        """
+
+        hla = Hla(self.id, self.name, self.__seq, List[HlaExon]())
+
+        for exon in self.__exons:
+            hla.add_exon(exon.copy())
+
+        return hla
 
     def get_exon_by_number(self, number: int) -> HlaExon:
-        exon = self.__exons.find(lambda exon, __, ___: exon.number == number)
+        exon = self.find_exon_by_number(number)
         return exon if exon else HlaExon.create_phantom()
 
+    def find_exon_by_number(self, number: int) -> Union[HlaExon, None]:
+        return self.exons_by_number.get(number)
+
     def add_exon(self, exon: HlaExon):
         self.__exons.append(exon)
         self.__exons_ranges.append(exon.range)
+        self.__invalidate_exons_cache()
 
-    def update_exons_seq(self, seq: str):
-        for exon in self.__exons:
-            exon.seq = seq
+    def __invalidate_exons_cache(self):
+        self.__exons_by_number = None
+        self.__exons_full = None
+        self.__last_exon_number = None
+
+    def update_exons_seq(self, seq: str, ranges: Union[Iterable[range], None] = None):
+        """Sets the sequence of every exon, sliced with `ranges`, as the cds
+        ranges of an HlaCdsView, instead of the exons ranges when given.
+        """
+
+        if ranges is None:
+            for exon in self.__exons:
+                exon.seq = seq
+        else:
+            for exon, range in zip(self.__exons, ranges):
+                exon.slice_seq(seq, range)
 
     def config_exons_ranges_for_cds(self):
         start = 0
@@ -258,7 +716,8 @@ class Hla:
 
     @property
     def seq(self) -> str:
-        return self.__seq
+        seq = self.__seq
+        return seq if isinstance(seq, str) else seq.value
 
     @property
     def exons(self) -> List[HlaExon]:
@@ -268,59 +727,182 @@ class Hla:
     def type(self) -> str:
         return self.name.split('*')[0]
 
+    @property
+    def exons_by_number(self) -> typing.Dict[int, HlaExon]:
+        exons_by_number = self.__exons_by_number
+
+        if exons_by_number is None:
+            exons_by_number = {}
+
+            for exon in self.__exons:
+                exons_by_number.setdefault(exon.number, exon)
+
+            self.__exons_by_number = exons_by_number
+
+        return exons_by_number
+
     @property
     def last_exon_number(self) -> int:
-        try:
-            return max([exon.number for exon in self.__exons])
-        except:
-            return 0
+        last_exon_number = self.__last_exon_number
+
+        if last_exon_number is None:
+            last_exon_number = max(self.exons_by_number, default=0)
+            self.__last_exon_number = last_exon_number
+
+        return last_exon_number
 
     @property
     def exons_full(self) -> List[HlaExon]:
-        return [self.get_exon_by_number(i) for i in range(1, self.last_exon_number + 1)]
+        exons_full = self.__exons_full
+
+        if exons_full is None:
+            exons_full = [
+                self.get_exon_by_number(i) for i in range(1, self.last_exon_number + 1)
+            ]
+            self.__exons_full = exons_full
+
+        return exons_full
+
+
+class HlaRecord(str):
+    """Raw record text that knows the file and byte offset it was read
+    from, so parsers can point back into the file instead of keeping parts
+    of the text. Readers hand it out only when the text is the exact decoded
+    bytes of the file.
+    """
+
+    def __new__(cls, text: str, path: Union[str, None] = None, offset: int = 0) -> HlaRecord:
+        record = super().__new__(cls, text)
+
+        record.path = path
+        record.offset = offset
+
+        return record
+
+
+class HlaLazySeq:
+    """Sequence kept as the `source` it is extracted from, by `extract`, the
+    first time it is read or sliced. The source is dropped once the
+    sequence is extracted.
+    """
+
+    __slots__ = ('__source', '__extract', '__seq')
+
+    def __init__(self, source, extract: typing.Callable[[typing.Any], str]) -> None:
+        self.__source = source
+        self.__extract = extract
+        self.__seq = None
+
+    def __getitem__(self, key) -> str:
+        return self.value[key]
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    @property
+    def value(self) -> str:
+        seq = self.__seq
+
+        if seq is None:
+            source = self.__source
+            seq = self.__seq if source is None else self.__extract(source)
+
+            self.__seq = seq
+            self.__source = None
+
+        return seq
 
 
 class HlaExon:
+    """Exon bounds over the sequence of its allele.
+
+    The exon keeps a reference to the sequence it was given plus the bounds
+    it had at that moment, and slices it only when `seq` is read, so the
+    alleles sequences are never copied per exon. Phantom exons are a single
+    shared, immutable instance.
+    """
+
+    __slots__ = ('__start', '__stop', '__number', '__seq_source', '__seq_start', '__seq_stop')
+
+    __phantom_exon = None
+
     def __init__(self, range: range) -> None:
-        self.range = range
-        self.__seq = ''
+        self.__start = 0
+        self.__stop = 0
         self.__number = 0
-        self.__phantom = False
-
-    def __setattr__(self, name: str, value) -> None:
-        try:
-            phantom = self.__phantom
-        except:
-            phantom = False
+        self.__seq_source = ''
+        self.__seq_start = 0
+        self.__seq_stop = 0
 
-        if not phantom:
-            object.__setattr__(self, name, value)
+        self.range = range
 
     @classmethod
     def create_phantom(cls) -> HlaExon:
-        exon = cls(range(0, 0))
-        setattr(exon, f'_{cls.__name__}__phantom', True)
+        if HlaExon.__phantom_exon is None:
+            HlaExon.__phantom_exon = HlaExon(range(0, 0))
+
+        return HlaExon.__phantom_exon
+
+    def copy(self) -> HlaExon:
+        if self.phantom:
+            return self
+
+        exon = HlaExon(self.range)
+
+        exon.__number = self.__number
+        exon.__seq_source = self.__seq_source
+        exon.__seq_start = self.__seq_start
+        exon.__seq_stop = self.__seq_stop
+
         return exon
 
+    def slice_seq(self, seq: str, range: range):
+        """Sets the sequence of the exon to `seq` sliced with `range`,
+        keeping the exon range, clamped as the range setter does.
+        """
+
+        if self.phantom:
+            return
+
+        self.__seq_source = seq
+        self.__seq_start = max(0, range.start)
+        self.__seq_stop = max(self.__seq_start, range.stop)
+
     @property
     def seq(self) -> str:
-        return self.__seq
+        return self.__seq_source[self.__seq_start:self.__seq_stop]
 
     @seq.setter
     def seq(self, seq: str):
-        start = self.range.start
-        stop = self.range.stop
-        self.__seq = seq[start:stop]
+        if self.phantom:
+            return
+
+        self.__seq_source = seq
+        self.__seq_start = self.__start
+        self.__seq_stop = self.__stop
 
     @property
     def range(self) -> range:
-        return self.__range
+        return range(self.__start, self.__stop)
 
     @range.setter
     def range(self, new_range: range):
+        if self.phantom:
+            return
+
         start = max(0, new_range.start)
         stop = max(start, new_range.stop)
-        self.__range = range(start, stop)
+
+        self.__start = start
+        self.__stop = stop
+
+    @property
+    def start(self) -> int:
+        return self.__start
+
+    @property
+    def stop(self) -> int:
+        return self.__stop
 
     @property
     def number(self) -> int:
@@ -329,13 +911,17 @@ class HlaExon:
     @number.setter
     def number(self, number):
         number = int(number)
-        if number > 0:
+        if number > 0 and not self.phantom:
             self.__number = number
 
     @property
     def phantom(self) -> bool:
-        return self.__phantom
+        return self is HlaExon.__phantom_exon
 
     @property
     def len(self) -> int:
-        return self.range.stop - self.range.start
+        return self.__stop - self.__start
+
+
+# Created on import, so threads writing alleles never race to create it.
+HlaExon.create_phantom()
@@ -0,0 +1,64 @@
+"""Library entry points to read and write alleles without going through
+the command line.
+
+    from hla_api import iter_hlas, write_hlas
+
+    hlas = iter_hlas('hla.dat', loci=['HLA-A'], names=['HLA-A*01:01:01:01'])
+    write_hlas(hlas, 'hla.imgt')
+
+Every call builds its own reader and writer, so results depend only on the
+arguments and concurrent calls do not share any state.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator, Union
+
+from hla import (Hla, HlaCollectionWriterStrategy, HlaCollections, HlaContentReaderStrategy,
+                 HlaReader, HlaStrParser, HlaStrParserStrategy, HlaWriter, StrHlaParser,
+                 StrHlaParserStrategy)
+from hla_metrics import HlaMetrics
+from hla_strategy.parser import HlaStrParserAsImgt, StrHlaParserSinglePassFromDat
+from hla_strategy.reader import HlaContentReaderBufferedFromDat
+from hla_strategy.writer import HlaCollectionWriterToImgt
+
+
+def iter_hlas(path: str, loci: Union[Iterable[str], None] = None,
+              names: Union[Iterable[str], None] = None, use_cds: bool = False,
+              reader_strategy: HlaContentReaderStrategy = HlaContentReaderBufferedFromDat,
+              parser_strategy: StrHlaParserStrategy = StrHlaParserSinglePassFromDat,
+              workers: int = 1, metrics: Union[HlaMetrics, None] = None) -> Iterator[Hla]:
+    """Yields the valid alleles of a dat file, plain or compressed, one by
+    one as the file is read. Records outside `loci` or `names` are skipped
+    before being parsed. Stopping the iteration stops the reading.
+    """
+
+    reader = HlaReader(
+        reader_strategy, StrHlaParser(parser_strategy), workers, loci, names, metrics
+    )
+
+    for hla in reader.iter_hlas(path):
+        if use_cds:
+            hla.config_exons_ranges_for_cds()
+
+        yield hla
+
+
+def write_hlas(hlas: Iterable[Hla], path: str,
+               writer_strategy: HlaCollectionWriterStrategy = HlaCollectionWriterToImgt,
+               parser_strategy: HlaStrParserStrategy = HlaStrParserAsImgt,
+               metrics: Union[HlaMetrics, None] = None) -> HlaCollections:
+    """Writes the alleles to an imgt file and returns them grouped by locus.
+
+    Exons are padded to the longest exon of their locus, so the alleles are
+    collected before the file is written.
+    """
+
+    hla_collections = HlaCollections()
+
+    for hla in hlas:
+        hla_collections.get_or_create(hla.type).add(hla)
+
+    HlaWriter(writer_strategy, HlaStrParser(parser_strategy), metrics).write(path, hla_collections)
+
+    return hla_collections
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Tuple, Union
+
+from hla import (Hla, HlaCollection, HlaCollectionWriterStrategy, HlaStrParser,
+                 HlaStrParserStrategy, HlaWriter)
+from hla_cds import HlaCdsView
+from hla_strategy.parser import HlaStrParserAsImgt
+from hla_strategy.writer import HlaCollectionWriterToImgt
+from super_collections import Dict, List
+
+
+class HlaBatchWriter:
+    """Writes several outputs from a single read of the dat, fasta and base
+    imgt files.
+
+    The shared alleles are never changed: every output gets its own
+    collections, where only the alleles taking a fasta sequence are copies,
+    sliced with the cds coordinates of a shared HlaCdsView for `use_cds`
+    outputs, and the alleles replaced from the base imgt file are the
+    shared parsed ones. The exon caches of the shared alleles are built
+    here, before the outputs are written from several threads. `seqs` and
+    `replacements` are the results of `HlaFastaMerger.load` and
+    `HlaImgtMerger.load`.
+    """
+
+    def __init__(self, hla_collections: Iterable[HlaCollection],
+                 seqs: Iterable[Tuple[Hla, str]] = (),
+                 replacements: Iterable[Tuple[HlaCollection, str, Hla]] = ()) -> None:
+        self.__hla_collections = List[HlaCollection](hla_collections)
+        self.__cds_views = HlaCdsView.of(self.__hla_collections)
+        self.__seqs = Dict[str]((hla.id, seq) for hla, seq in seqs)
+        self.__replacements = {
+            (hla_collection.type, id): imgt_hla for hla_collection, id, imgt_hla in replacements
+        }
+
+        for hla_collection in self.__hla_collections:
+            for hla in hla_collection.hlas.values():
+                hla.exons_full
+
+        for imgt_hla in self.__replacements.values():
+            imgt_hla.exons_full
+
+    def write(self, outputs: Iterable[HlaBatchOutput], workers: Union[int, None] = None) -> List[int]:
+        """Writes the outputs in a pool of `workers` threads and returns the
+        number of alleles written to each one.
+        """
+
+        with ThreadPoolExecutor(workers) as executor:
+            return List[int](executor.map(self.__write_output, outputs))
+
+    def __write_output(self, output: HlaBatchOutput) -> int:
+        hla_collections = self.collections_for(output)
+        writer = HlaWriter(output.writer_strategy, HlaStrParser(output.writer_parser_strategy))
+
+        if output.shards_dir:
+            writer.write_shards(output.shards_dir, hla_collections, output.imgt_file)
+        else:
+            writer.write(output.imgt_file, hla_collections)
+
+        return sum(len(hla_collection.hlas) for hla_collection in hla_collections)
+
+    def collections_for(self, output: HlaBatchOutput) -> List[HlaCollection]:
+        """Returns the collections of the output in the order of the shared
+        ones, which a new set of them would not keep.
+        """
+
+        return List[HlaCollection](
+            hla_collection.derive(Dict[Hla](
+                (id, self.__derive_hla(hla_collection.type, id, hla, output))
+                for id, hla in hla_collection.hlas.items()
+            ))
+            for hla_collection in self.__hla_collections
+        )
+
+    def __derive_hla(self, type: str, id: str, hla: Hla, output: HlaBatchOutput) -> Hla:
+        if output.from_imgt:
+            imgt_hla = self.__replacements.get((type, id))
+
+            if imgt_hla is not None:
+                return imgt_hla
+
+        seq = self.__seqs.get(hla.id) if output.fasta else None
+
+        if seq is None:
+            return hla
+
+        hla = hla.copy()
+
+        if output.use_cds:
+            hla.update_exons_seq(seq, self.__cds_views[type].ranges(id))
+        else:
+            hla.update_exons_seq(seq)
+
+        return hla
+
+
+class HlaBatchOutput:
+    """One output of a batch: where it is written, how, and which of the
+    shared inputs it takes.
+    """
+
+    def __init__(self, imgt_file: Union[str, None] = None, shards_dir: Union[str, None] = None,
+                 writer_strategy: HlaCollectionWriterStrategy = HlaCollectionWriterToImgt,
+                 writer_parser_strategy: HlaStrParserStrategy = HlaStrParserAsImgt,
+                 use_cds: bool = False, fasta: bool = True, from_imgt: bool = True) -> None:
+        self.__imgt_file = imgt_file
+        self.__shards_dir = shards_dir
+        self.__writer_strategy = writer_strategy
+        self.__writer_parser_strategy = writer_parser_strategy
+        self.__use_cds = use_cds
+        self.__fasta = fasta
+        self.__from_imgt = from_imgt
+
+    @property
+    def imgt_file(self) -> Union[str, None]:
+        return self.__imgt_file
+
+    @property
+    def shards_dir(self) -> Union[str, None]:
+        return self.__shards_dir
+
+    @property
+    def writer_strategy(self) -> HlaCollectionWriterStrategy:
+        return self.__writer_strategy
+
+    @property
+    def writer_parser_strategy(self) -> HlaStrParserStrategy:
+        return self.__writer_parser_strategy
+
+    @property
+    def use_cds(self) -> bool:
+        return self.__use_cds
+
+    @property
+    def fasta(self) -> bool:
+        return self.__fasta
+
+    @property
+    def from_imgt(self) -> bool:
+        return self.__from_imgt
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable, Union
+
+from hla import HlaCollections, HlaReader
+from hla_columnar import HlaColumnarCollection
+from super_collections import Dict, List
+
+
+class HlaCache:
+    """Content addressed cache of the collections parsed from a file.
+
+    Entries are keyed by the sha1 of the input file, computed again only
+    when its size or modification time change, the reader and parser
+    strategies, the read filters and the loci and names of the reader. Each
+    entry is one binary file: a json header followed by the raw columns of
+    a HlaColumnarCollection per locus, loaded back through mmap without any
+    parsing. The least recently used entries are evicted once the cache
+    grows past `max_size` bytes. A cache that can not be written is not an
+    error: `read` returns the parsed collections without storing them.
+    """
+
+    MAGIC = b'HLAC'
+    VERSION = 2
+    SUFFIX = '.hlac'
+    DIGEST_SUFFIX = '.sha1'
+
+    __header = struct.Struct('<4sIQ')
+
+    def __init__(self, cache_dir: str, max_size: int) -> None:
+        self.__cache_dir = cache_dir
+        self.__max_size = max_size
+
+    @staticmethod
+    def default_dir() -> str:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        return os.path.join(cache_home, 'hla-db-extractor')
+
+    def read(self, reader: HlaReader, path: str, types: Union[Iterable[str], None] = None,
+             names: Union[Iterable[str], None] = None) -> HlaCollections:
+        key = self.key(reader, path, types, names)
+        hla_collections = self.load(key)
+
+        if hla_collections is not None:
+            return hla_collections
+
+        hla_collections = reader.read(path, types, names)
+
+        try:
+            self.store(key, hla_collections)
+        except OSError:
+            pass
+
+        return hla_collections
+
+    def key(self, reader: HlaReader, path: str, types: Union[Iterable[str], None] = None,
+            names: Union[Iterable[str], None] = None) -> str:
+        key = hashlib.sha1(self.file_sha1(path).encode())
+        parser = getattr(reader.parser, 'strategy', reader.parser)
+
+        key.update(json.dumps([
+            self.VERSION,
+            sys.byteorder,
+            reader.strategy.__name__,
+            parser.__name__,
+            sorted(types) if types is not None else None,
+            sorted(names) if names is not None else None,
+            sorted(reader.loci) if reader.loci is not None else None,
+            sorted(reader.names) if reader.names is not None else None
+        ]).encode())
+
+        return key.hexdigest()
+
+    def file_sha1(self, path: str) -> str:
+        """Returns the sha1 of the file at `path`, kept in the cache
+        directory with the size and modification time of the file, and
+        hashed again only when they change, as HlaFileIndex revalidates.
+        """
+
+        stat = os.stat(path)
+        digest_path = os.path.join(
+            self.cache_dir,
+            f'{hashlib.sha1(os.path.abspath(path).encode()).hexdigest()}{self.DIGEST_SUFFIX}'
+        )
+
+        try:
+            with open(digest_path, 'r') as file:
+                size, mtime_ns, sha1 = file.read().split('\t')
+
+            if int(size) == stat.st_size and int(mtime_ns) == stat.st_mtime_ns:
+                return sha1
+        except (OSError, ValueError):
+            pass
+
+        sha1 = hashlib.sha1()
+
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                sha1.update(chunk)
+
+        sha1 = sha1.hexdigest()
+        tmp_path = f'{digest_path}.tmp'
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            with open(tmp_path, 'w') as file:
+                file.write(f'{stat.st_size}\t{stat.st_mtime_ns}\t{sha1}')
+
+            os.replace(tmp_path, digest_path)
+        except OSError:
+            pass
+
+        return sha1
+
+    def load(self, key: str) -> Union[HlaCollections, None]:
+        path = self.__entry_path(key)
+
+        try:
+            with open(path, 'rb') as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hla_collections = self.__load_mapped(mapped)
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return hla_collections
+
+    def store(self, key: str, hla_collections: HlaCollections):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        path = self.__entry_path(key)
+        tmp_path = f'{path}.tmp'
+        header = List[dict]()
+        columns_data = List[Union[bytearray, array]]()
+        offset = 0
+
+        for type in hla_collections.types:
+            columnar = HlaColumnarCollection.from_collection(hla_collections.get(type))
+            columns = Dict()
+
+            for name, column in columnar.columns.items():
+                nbytes = len(column) * getattr(column, 'itemsize', 1)
+                typecode = getattr(column, 'typecode', None)
+                columns[name] = [offset, nbytes, typecode]
+                columns_data.append(column)
+                offset += nbytes
+
+            header.append({
+                'type': type,
+                'ids': columnar.ids,
+                'names': columnar.names,
+                'exons_max_len': columnar.exons_max_len,
+                'columns': columns
+            })
+
+        header = json.dumps(header).encode()
+
+        try:
+            with open(tmp_path, 'wb') as file:
+                file.write(self.__header.pack(self.MAGIC, self.VERSION, len(header)))
+                file.write(header)
+
+                for column in columns_data:
+                    file.write(column)
+
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        entries = List[os.DirEntry]()
+
+        try:
+            with os.scandir(self.cache_dir) as it:
+                entries.extend(e for e in it if e.name.endswith(self.SUFFIX))
+        except OSError:
+            return
+
+        try:
+            entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        except OSError:
+            return
+
+        size = 0
+
+        for entry in entries:
+            try:
+                size += entry.stat().st_size
+
+                if size > self.max_size:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+    def __load_mapped(self, mapped: mmap.mmap) -> HlaCollections:
+        magic, version, header_len = self.__header.unpack_from(mapped, 0)
+
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('Invalid cache entry')
+
+        data_start = self.__header.size + header_len
+        header = json.loads(mapped[self.__header.size:data_start])
+        view = memoryview(mapped)
+        hla_collections = HlaCollections()
+
+        try:
+            if not isinstance(header, list):
+                raise ValueError('Invalid cache entry')
+
+            for collection in header:
+                columns = Dict()
+
+                for name, (offset, nbytes, typecode) in collection['columns'].items():
+                    data = view[data_start + offset:data_start + offset + nbytes]
+
+                    if typecode:
+                        column = array(typecode)
+                        column.frombytes(data)
+                    else:
+                        column = bytearray(data)
+
+                    data.release()
+                    columns[name] = column
+
+                columnar = HlaColumnarCollection.from_columns(
+                    collection['type'],
+                    collection['ids'],
+                    collection['names'],
+                    columns,
+                    collection['exons_max_len']
+                )
+
+                hla_collections.add(columnar.to_collection())
+        except (KeyError, TypeError, AttributeError, IndexError) as error:
+            raise ValueError('Invalid cache entry') from error
+        finally:
+            view.release()
+
+        return hla_collections
+
+    def __entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}{self.SUFFIX}')
+
+    @property
+    def cache_dir(self) -> str:
+        return self.__cache_dir
+
+    @property
+    def max_size(self) -> int:
+        return self.__max_size
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from array import array
+from itertools import accumulate
+from typing import Iterable
+
+from hla import HlaCollection
+from super_collections import Dict, List
+
+
+class HlaCdsView:
+    """Cds coordinates of the exons of every allele of a collection.
+
+    The cds bounds of an allele are the prefix sums of its exon lengths,
+    computed for the whole collection in one pass into a single array, with
+    the offset of every allele in it, as in HlaColumnarCollection. The
+    genomic ranges of the exons are never changed, so the same alleles can
+    be written with both coordinates, from any thread.
+    """
+
+    def __init__(self, hla_collection: HlaCollection) -> None:
+        self.__type = hla_collection.type
+        self.__indexes = Dict[int]()
+        self.__offsets = array('Q', [0])
+        self.__bounds = array('Q')
+
+        for id, hla in hla_collection.hlas.items():
+            self.__indexes[id] = len(self.__indexes)
+            self.__bounds.extend(accumulate((exon.len for exon in hla.exons), initial=0))
+            self.__offsets.append(len(self.__bounds))
+
+    @classmethod
+    def of(cls, hla_collections: Iterable[HlaCollection]) -> Dict[HlaCdsView]:
+        return Dict[HlaCdsView](
+            (hla_collection.type, cls(hla_collection)) for hla_collection in hla_collections
+        )
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.__indexes
+
+    def __len__(self) -> int:
+        return len(self.__indexes)
+
+    def bounds(self, id: str) -> array:
+        """Returns the cds start of every exon of the allele, in the order
+        of its exons, followed by the cds end of the last one.
+        """
+
+        index = self.__indexes[id]
+        return self.__bounds[self.__offsets[index]:self.__offsets[index + 1]]
+
+    def ranges(self, id: str) -> List[range]:
+        bounds = self.bounds(id)
+        return List[range](range(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1))
+
+    @property
+    def type(self) -> str:
+        return self.__type
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Mapping
+from itertools import chain, repeat
+from operator import sub
+from typing import Iterator, Union
+
+from hla import Hla, HlaCollection, HlaExon
+from super_collections import List
+
+
+class HlaColumnarCollection:
+    """Array backed alternative to HlaCollection.
+
+    The sequences of every allele live in one contiguous byte buffer, and
+    the alleles sequence offsets and lengths and the exons bounds, numbers
+    and sequence offsets in parallel `array`s, instead of one Hla and one HlaExon object per
+    allele and exon. Exon sequences that are a slice of their allele
+    sequence, the usual case, point into it and are not stored twice.
+
+    `hlas` is a read only mapping that builds each Hla on access, so the
+    collection can be handed to any HlaWriter as is, while
+    HlaCollectionWriterColumnarToImgt writes it straight from the arrays,
+    with `exon_seqs`, without building any allele.
+
+    The exons max lengths are reduced over the arrays the first time they
+    are read after alleles are added. `from_collection` keeps the maxima of
+    the source collection, as alleles replaced through `HlaCollection.hlas`
+    do not update them.
+    """
+
+    def __init__(self, type: str) -> None:
+        self.__type = type
+
+        self.__ids = List[str]()
+        self.__names = List[str]()
+        self.__seqs = bytearray()
+        self.__seq_offsets = array('Q')
+        self.__seq_lens = array('Q')
+
+        self.__exon_offsets = array('Q', [0])
+        self.__exon_starts = array('Q')
+        self.__exon_stops = array('Q')
+        self.__exon_numbers = array('L')
+        self.__exon_seq_offsets = array('Q')
+        self.__exon_seq_lens = array('Q')
+
+        self.__exons_max_len = None
+        self.__hlas = HlaColumnarView(self)
+
+    def __eq__(self, other: HlaColumnarCollection) -> bool:
+        return self.type == other.type
+
+    def __hash__(self) -> int:
+        return hash(self.type)
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    @classmethod
+    def from_collection(cls, hla_collection: HlaCollection) -> HlaColumnarCollection:
+        columnar = cls(hla_collection.type)
+
+        for hla in hla_collection.hlas.values():
+            columnar.add(hla)
+
+        columnar.__exons_max_len = List[int](hla_collection.exons_max_len)
+
+        return columnar
+
+    @classmethod
+    def from_columns(cls, type: str, ids: List[str], names: List[str], columns: dict,
+                     exons_max_len: List[int]) -> HlaColumnarCollection:
+        columnar = cls(type)
+
+        columnar.__ids = List[str](ids)
+        columnar.__names = List[str](names)
+        columnar.__seqs = columns['seqs']
+        columnar.__seq_offsets = columns['seq_offsets']
+        columnar.__seq_lens = columns['seq_lens']
+        columnar.__exon_offsets = columns['exon_offsets']
+        columnar.__exon_starts = columns['exon_starts']
+        columnar.__exon_stops = columns['exon_stops']
+        columnar.__exon_numbers = columns['exon_numbers']
+        columnar.__exon_seq_offsets = columns['exon_seq_offsets']
+        columnar.__exon_seq_lens = columns['exon_seq_lens']
+        columnar.__exons_max_len = List[int](exons_max_len)
+
+        return columnar
+
+    def to_collection(self) -> HlaCollection:
+        hla_collection = HlaCollection(self.type)
+
+        for hla in self.hlas.values():
+            hla_collection.add(hla)
+
+        return hla_collection
+
+    def add(self, hla: Hla):
+        seq = hla.seq.encode()
+        seq_offset = len(self.__seqs)
+        self.__seqs += seq
+
+        for exon in hla.exons:
+            exon_seq = exon.seq
+
+            if hla.seq[exon.start:exon.stop] == exon_seq:
+                exon_seq_offset = seq_offset + exon.start
+            else:
+                exon_seq_offset = len(self.__seqs)
+                self.__seqs += exon_seq.encode()
+
+            self.__exon_starts.append(exon.start)
+            self.__exon_stops.append(exon.stop)
+            self.__exon_numbers.append(exon.number)
+            self.__exon_seq_offsets.append(exon_seq_offset)
+            self.__exon_seq_lens.append(len(exon_seq))
+
+        self.__ids.append(hla.id)
+        self.__names.append(hla.name)
+        self.__seq_offsets.append(seq_offset)
+        self.__seq_lens.append(len(seq))
+        self.__exon_offsets.append(len(self.__exon_starts))
+
+        self.__exons_max_len = None
+        self.__hlas.invalidate()
+
+    def get_hla(self, index: int) -> Hla:
+        seq_start = self.__seq_offsets[index]
+        seq_stop = seq_start + self.__seq_lens[index]
+        seq = self.__decode(seq_start, seq_stop)
+        exons = List[HlaExon]()
+
+        for k in range(self.__exon_offsets[index], self.__exon_offsets[index + 1]):
+            exon_seq_start = self.__exon_seq_offsets[k]
+            exon_seq_stop = exon_seq_start + self.__exon_seq_lens[k]
+
+            exon = HlaExon(range(self.__exon_starts[k], self.__exon_stops[k]))
+            exon.number = self.__exon_numbers[k]
+
+            if seq_start <= exon_seq_start and exon_seq_stop <= seq_stop:
+                exon.slice_seq(seq, range(exon_seq_start - seq_start, exon_seq_stop - seq_start))
+            else:
+                exon_seq = self.__decode(exon_seq_start, exon_seq_stop)
+                exon.slice_seq(exon_seq, range(0, len(exon_seq)))
+
+            exons.append(exon)
+
+        return Hla(self.__ids[index], self.__names[index], seq, exons)
+
+    def exon_seqs(self, index: int, qt_exons: int) -> List[Union[str, None]]:
+        """Returns the sequence of every exon number of the allele at
+        `index`, from 1 to `qt_exons`, sliced from the sequences buffer,
+        None for the numbers the allele does not have.
+        """
+
+        seq_start = self.__seq_offsets[index]
+        seq_stop = seq_start + self.__seq_lens[index]
+        seq = None
+        numbers = self.__exon_numbers
+        exon_seq_offsets = self.__exon_seq_offsets
+        exon_seq_lens = self.__exon_seq_lens
+        exon_seqs = List[Union[str, None]]([None] * qt_exons)
+
+        # Backwards, so the first exon of a repeated number wins, as in
+        # Hla.exons_by_number.
+        for k in reversed(range(self.__exon_offsets[index], self.__exon_offsets[index + 1])):
+            number = numbers[k]
+
+            if not 0 < number <= qt_exons:
+                continue
+
+            exon_seq_start = exon_seq_offsets[k]
+            exon_seq_stop = exon_seq_start + exon_seq_lens[k]
+
+            if seq_start <= exon_seq_start and exon_seq_stop <= seq_stop:
+                if seq is None:
+                    seq = self.__decode(seq_start, seq_stop)
+
+                exon_seqs[number - 1] = seq[exon_seq_start - seq_start:exon_seq_stop - seq_start]
+            else:
+                exon_seqs[number - 1] = self.__decode(exon_seq_start, exon_seq_stop)
+
+        return exon_seqs
+
+    def __decode(self, start: int, stop: int) -> str:
+        return self.__seqs[start:stop].decode()
+
+    def __reduce_exons_max_len(self) -> List[int]:
+        offsets = self.__exon_offsets
+        alleles = chain.from_iterable(
+            repeat(index, offsets[index + 1] - offsets[index]) for index in range(len(self))
+        )
+        keys = List[tuple](zip(alleles, self.__exon_numbers))
+        exon_lens = List[int](map(sub, self.__exon_stops, self.__exon_starts))
+
+        # Keyed by allele and number, built backwards so the first exon of a
+        # repeated number wins, as in Hla.exons_by_number.
+        exon_lens_by_key = dict(zip(reversed(keys), reversed(exon_lens)))
+        exons_max_len = List[int]()
+
+        for (__, number), exon_len in exon_lens_by_key.items():
+            if number == 0:
+                continue
+
+            if number > len(exons_max_len):
+                exons_max_len.extend([0] * (number - len(exons_max_len)))
+
+            if exon_len > exons_max_len[number - 1]:
+                exons_max_len[number - 1] = exon_len
+
+        return exons_max_len
+
+    @property
+    def type(self) -> str:
+        return self.__type
+
+    @property
+    def ids(self) -> List[str]:
+        return self.__ids
+
+    @property
+    def names(self) -> List[str]:
+        return self.__names
+
+    @property
+    def hlas(self) -> HlaColumnarView:
+        return self.__hlas
+
+    @property
+    def exons_max_len(self) -> List[int]:
+        if self.__exons_max_len is None:
+            self.__exons_max_len = self.__reduce_exons_max_len()
+
+        return self.__exons_max_len
+
+    @property
+    def qt_exons(self) -> int:
+        return len(self.exons_max_len)
+
+    @property
+    def columns(self) -> dict:
+        return {
+            'seqs': self.__seqs,
+            'seq_offsets': self.__seq_offsets,
+            'seq_lens': self.__seq_lens,
+            'exon_offsets': self.__exon_offsets,
+            'exon_starts': self.__exon_starts,
+            'exon_stops': self.__exon_stops,
+            'exon_numbers': self.__exon_numbers,
+            'exon_seq_offsets': self.__exon_seq_offsets,
+            'exon_seq_lens': self.__exon_seq_lens
+        }
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (
+            self.__seq_offsets, self.__seq_lens, self.__exon_offsets, self.__exon_starts,
+            self.__exon_stops, self.__exon_numbers, self.__exon_seq_offsets,
+            self.__exon_seq_lens
+        )
+
+        return len(self.__seqs) + sum(a.itemsize * len(a) for a in arrays)
+
+
+class HlaColumnarView(Mapping):
+    """Read only `id -> Hla` mapping over a HlaColumnarCollection."""
+
+    def __init__(self, columnar: HlaColumnarCollection) -> None:
+        self.__columnar = columnar
+        self.__indexes = None
+
+    def invalidate(self):
+        self.__indexes = None
+
+    def __getitem__(self, id: str) -> Hla:
+        return self.__columnar.get_hla(self.__get_indexes()[id])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__columnar.ids)
+
+    def __len__(self) -> int:
+        return len(self.__columnar)
+
+    def values(self) -> Iterator[Hla]:
+        for index in range(len(self.__columnar)):
+            yield self.__columnar.get_hla(index)
+
+    def get(self, id: str, default: Union[Hla, None] = None) -> Union[Hla, None]:
+        index = self.__get_indexes().get(id)
+        return self.__columnar.get_hla(index) if index is not None else default
+
+    def __get_indexes(self):
+        if self.__indexes is None:
+            self.__indexes = {id: i for i, id in enumerate(self.__columnar.ids)}
+
+        return self.__indexes
+
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Iterable, Iterator, Tuple, Union
+
+from compression import open_text
+from hla import Hla, HlaReader, HlaWriter
+from super_collections import Dict, List
+
+
+class HlaIncrementalWriter:
+    """Rewrites only the loci of a shards directory touched by a new release.
+
+    Every run saves, next to the shards, the checksum of every dat record,
+    the exon lengths of its allele and where it was written, plus the exons
+    max lengths of every locus. The next run hashes the raw records, parses
+    only the new or changed ones and rewrites only the loci that gained,
+    changed or lost alleles. In those loci, alleles that did not change are
+    copied from the previous shard, unless the locus exons max lengths
+    changed, in which case they are parsed again. Without a previous state,
+    or with different options, everything is rebuilt.
+    """
+
+    STATE_FILE = 'state.json'
+    VERSION = 1
+
+    def __init__(self, reader: HlaReader, writer: HlaWriter) -> None:
+        self.__reader = reader
+        self.__writer = writer
+
+    def write(self, dat_path: str, shards_dir: str, imgt_path: Union[str, None] = None,
+              types: Union[Iterable[str], None] = None, use_cds: bool = False) -> HlaIncrementalReport:
+        types = sorted(set(types)) if types is not None else None
+        options = {
+            'reader_parser': self.reader.parser.strategy.__name__,
+            'writer_parser': self.writer.parser.strategy.__name__,
+            'use_cds': use_cds,
+            'types': types
+        }
+
+        os.makedirs(shards_dir, exist_ok=True)
+
+        state = self.__load_state(shards_dir, options)
+        old_records = state['records']
+        old_loci = state['loci']
+
+        records = Dict[dict]()
+        loci_ids = Dict[List[str]]()
+        hlas = Dict[Hla]()
+        report = HlaIncrementalReport()
+        parsed_ids = List[str]()
+
+        def changed_contents() -> Iterator[str]:
+            for id, type, checksum, hla_content in self.__scan(dat_path, types):
+                if id in records:
+                    continue
+
+                old_record = old_records.get(id)
+                loci_ids.setdefault(type, List[str]()).append(id)
+
+                if old_record and old_record['checksum'] == checksum and old_record['type'] == type:
+                    records[id] = dict(old_record)
+                    continue
+
+                records[id] = {'type': type, 'checksum': checksum, 'exons_len': None}
+
+                if old_record:
+                    report.changed.append(id)
+                    report.affected_loci.add(old_record['type'])
+                else:
+                    report.added.append(id)
+
+                report.affected_loci.add(type)
+                parsed_ids.append(id)
+
+                yield hla_content
+
+        hlas.update((hla.id, hla) for hla in self.__parse(changed_contents(), use_cds))
+
+        for id in parsed_ids:
+            hla = hlas.get(id)
+
+            if hla:
+                records[id]['exons_len'] = [exon.len for exon in hla.exons_full]
+
+        for id, old_record in old_records.items():
+            if id not in records:
+                report.removed.append(id)
+                report.affected_loci.add(old_record['type'])
+
+        loci = Dict[dict]()
+        to_reparse = set()
+
+        for type, ids in loci_ids.items():
+            exons_max_len = self.__reduce_exons_max_len(
+                records[id]['exons_len'] for id in ids
+            )
+            loci[type] = {'exons_max_len': exons_max_len}
+
+            old_locus = old_loci.get(type)
+            has_shard = os.path.exists(HlaWriter.shard_path(shards_dir, type))
+
+            if type not in report.affected_loci and old_locus and has_shard:
+                continue
+
+            report.affected_loci.add(type)
+
+            if not old_locus or not has_shard or old_locus['exons_max_len'] != exons_max_len:
+                to_reparse.update(id for id in ids if id not in hlas)
+
+        if to_reparse:
+            hla_contents = (
+                hla_content for __, __, __, hla_content in self.__scan(dat_path, types, to_reparse)
+            )
+            hlas.update((hla.id, hla) for hla in self.__parse(hla_contents, use_cds))
+
+        with self.writer.measure() as stage:
+            for type in sorted(report.affected_loci):
+                shard = HlaWriter.shard_path(shards_dir, type)
+
+                if type not in loci:
+                    if os.path.exists(shard):
+                        os.remove(shard)
+                    continue
+
+                written, size = self.__write_shard(shard, loci_ids[type], records, loci[type], hlas)
+
+                if stage:
+                    stage.records += written
+                    stage.bytes += size
+
+        self.__save_state(shards_dir, options, records, loci)
+
+        if imgt_path:
+            HlaWriter.concat_shards(
+                imgt_path, [HlaWriter.shard_path(shards_dir, type) for type in sorted(loci)]
+            )
+
+        return report
+
+    def __scan(self, dat_path: str, types: Union[List[str], None],
+               ids: Union[set, None] = None) -> Iterable[tuple]:
+        parser = self.reader.parser
+
+        with (open_text(dat_path)) as file:
+            for hla_content in self.reader.iter_hla_contents(file):
+                id = parser.peek_id(hla_content)
+                type = parser.peek_type(hla_content)
+
+                if id is None or type is None:
+                    continue
+
+                if types is not None and type not in types:
+                    continue
+
+                if ids is not None and id not in ids:
+                    continue
+
+                checksum = hashlib.sha1(hla_content.encode()).hexdigest()
+
+                yield id, type, checksum, hla_content
+
+    def __parse(self, hla_contents: Iterable[str], use_cds: bool) -> Iterator[Hla]:
+        for hla in self.reader.parse_hla_contents(hla_contents):
+            if use_cds:
+                hla.config_exons_ranges_for_cds()
+
+            yield hla
+
+    def __write_shard(self, shard: str, ids: List[str], records: Dict[dict], locus: dict,
+                      hlas: Dict[Hla]) -> Tuple[int, int]:
+        """Returns the number of alleles written and the size of the shard."""
+
+        tmp_shard = f'{shard}.tmp'
+        parser = self.writer.parser
+        exons_max_len = locus['exons_max_len']
+        qt_exons = len(exons_max_len)
+        offset = 0
+        written = 0
+
+        with open(tmp_shard, 'wb') as file, self.__open_old_shard(shard) as old_file:
+            for id in ids:
+                record = records[id]
+
+                if record['exons_len'] is None:
+                    continue
+
+                hla = hlas.get(id)
+
+                if hla:
+                    pieces = List[str]()
+                    parser.parse_into(
+                        hla, pieces, exons_max_len=exons_max_len, qt_exons=qt_exons
+                    )
+                    content = ''.join(pieces).encode()
+                else:
+                    old_file.seek(record['offset'])
+                    content = old_file.read(record['length'])
+
+                file.write(content)
+
+                record['offset'] = offset
+                record['length'] = len(content)
+                offset += len(content)
+                written += 1
+
+        os.replace(tmp_shard, shard)
+
+        return written, offset
+
+    @staticmethod
+    def __open_old_shard(shard: str):
+        return open(shard if os.path.exists(shard) else os.devnull, 'rb')
+
+    @staticmethod
+    def __reduce_exons_max_len(exons_lens: Iterable[Union[List[int], None]]) -> List[int]:
+        exons_max_len = List[int]()
+
+        for exons_len in exons_lens:
+            if exons_len is None:
+                continue
+
+            for i, exon_len in enumerate(exons_len):
+                if i == len(exons_max_len):
+                    exons_max_len.append(exon_len)
+                elif exon_len > exons_max_len[i]:
+                    exons_max_len[i] = exon_len
+
+        return exons_max_len
+
+    def __load_state(self, shards_dir: str, options: dict) -> dict:
+        empty_state = {'records': {}, 'loci': {}}
+
+        try:
+            with open(os.path.join(shards_dir, self.STATE_FILE), 'r') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return empty_state
+
+        if state.get('version') != self.VERSION or state.get('options') != options:
+            return empty_state
+
+        return state
+
+    def __save_state(self, shards_dir: str, options: dict, records: Dict[dict], loci: Dict[dict]):
+        path = os.path.join(shards_dir, self.STATE_FILE)
+        tmp_path = f'{path}.tmp'
+
+        with open(tmp_path, 'w') as file:
+            json.dump({
+                'version': self.VERSION,
+                'options': options,
+                'records': records,
+                'loci': loci
+            }, file)
+
+        os.replace(tmp_path, path)
+
+    @property
+    def reader(self) -> HlaReader:
+        return self.__reader
+
+    @property
+    def writer(self) -> HlaWriter:
+        return self.__writer
+
+
+class HlaIncrementalReport:
+    def __init__(self) -> None:
+        self.added = List[str]()
+        self.changed = List[str]()
+        self.removed = List[str]()
+        self.affected_loci = set()
+
+    def __str__(self) -> str:
+        loci = ', '.join(sorted(self.affected_loci)) or 'none'
+
+        return (
+            f'Added: {len(self.added)}, changed: {len(self.changed)}, '
+            f'removed: {len(self.removed)}\n'
+            f'Rewritten loci: {loci}'
+        )
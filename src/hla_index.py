@@ -0,0 +1,489 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, Union
+
+from super_collections import Dict, List
+
+
+class HlaFileIndex(ABC):
+    """Sidecar index of the records of a file.
+
+    The index is written next to the indexed file, as `<path><SUFFIX>`, and
+    is bound to the size, modification time and sha1 of the file it was
+    built from. A touched but unchanged file is revalidated by its hash,
+    once, as the index is saved again with the new modification time.
+    When the index can not be written, as next to a read-only file, `get`
+    keeps using the index it built in memory.
+    """
+
+    SUFFIX = ''
+    MAGIC = ''
+    VERSION = '1'
+
+    def __init__(self, size: int, mtime_ns: int, sha1: str, entries: List) -> None:
+        self.__size = size
+        self.__mtime_ns = mtime_ns
+        self.__sha1 = sha1
+        self.__entries = entries
+
+    @classmethod
+    def get(cls, path: str) -> HlaFileIndex:
+        index = cls.load(path)
+
+        if index:
+            mtime_ns = index.mtime_ns
+
+            if index.is_valid(path):
+                if index.mtime_ns != mtime_ns:
+                    index.__try_save(path)
+
+                return index
+
+        index = cls.build(path)
+        index.__try_save(path)
+
+        return index
+
+    def __try_save(self, path: str):
+        try:
+            self.save(path)
+        except OSError:
+            pass
+
+    @classmethod
+    def build(cls, path: str) -> HlaFileIndex:
+        stat = os.stat(path)
+        entries = List()
+
+        with open(path, 'rb') as file:
+            if stat.st_size == 0:
+                return cls(0, stat.st_mtime_ns, hashlib.sha1().hexdigest(), entries)
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                entries.extend(cls._iter_entries(mapped))
+                sha1 = hashlib.sha1(mapped).hexdigest()
+
+        return cls(stat.st_size, stat.st_mtime_ns, sha1, entries)
+
+    @classmethod
+    def load(cls, path: str) -> Union[HlaFileIndex, None]:
+        try:
+            with open(cls.path_for(path), 'r') as file:
+                header = file.readline().rstrip('\n').split('\t')
+
+                if len(header) != 5 or header[:2] != [cls.MAGIC, cls.VERSION]:
+                    return None
+
+                size, mtime_ns, sha1 = int(header[2]), int(header[3]), header[4]
+                entries = List()
+
+                for line in file:
+                    entries.append(cls._entry_from_row(line.rstrip('\n').split('\t')))
+        except (OSError, ValueError):
+            return None
+
+        return cls(size, mtime_ns, sha1, entries)
+
+    def save(self, path: str):
+        path = self.path_for(path)
+        tmp_path = f'{path}.tmp'
+
+        try:
+            with open(tmp_path, 'w') as file:
+                file.write(
+                    f'{self.MAGIC}\t{self.VERSION}\t{self.size}\t{self.mtime_ns}\t{self.sha1}\n'
+                )
+
+                for entry in self.entries:
+                    file.write('\t'.join(str(field) for field in self._entry_row(entry)) + '\n')
+
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def is_valid(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+
+        if stat.st_size != self.size:
+            return False
+
+        if stat.st_mtime_ns == self.mtime_ns:
+            return True
+
+        if self.__file_sha1(path) != self.sha1:
+            return False
+
+        self.__mtime_ns = stat.st_mtime_ns
+
+        return True
+
+    @classmethod
+    def path_for(cls, path: str) -> str:
+        return f'{path}{cls.SUFFIX}'
+
+    @classmethod
+    @abstractmethod
+    def _iter_entries(cls, mapped: mmap.mmap) -> Iterator:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _entry_row(entry) -> tuple:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def _entry_from_row(row: List[str]):
+        pass
+
+    @staticmethod
+    def __file_sha1(path: str) -> str:
+        sha1 = hashlib.sha1()
+
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                sha1.update(chunk)
+
+        return sha1.hexdigest()
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def mtime_ns(self) -> int:
+        return self.__mtime_ns
+
+    @property
+    def sha1(self) -> str:
+        return self.__sha1
+
+    @property
+    def entries(self) -> List:
+        return self.__entries
+
+
+class HlaDatIndex(HlaFileIndex):
+    """Index with the byte offset of every record of a dat file, written as
+    `<dat>.idx`.
+    """
+
+    SUFFIX = '.idx'
+    MAGIC = '#hla-dat-index'
+
+    __id_regex = re.compile(rb'^ID {3}(\w+)', re.MULTILINE)
+    __name_regex = re.compile(rb'^DE {3}(.+?),', re.MULTILINE)
+
+    def find(self, types: Union[Iterable[str], None] = None,
+             names: Union[Iterable[str], None] = None) -> Iterator[HlaDatIndexEntry]:
+        types = set(types) if types is not None else None
+        names = set(names) if names is not None else None
+
+        for entry in self.entries:
+            if types is not None and entry.type not in types:
+                continue
+
+            if names is not None and entry.name not in names:
+                continue
+
+            yield entry
+
+    @classmethod
+    def _iter_entries(cls, mapped: mmap.mmap) -> Iterator[HlaDatIndexEntry]:
+        for offset, length in cls.__iter_records(mapped):
+            entry = cls.__create_entry(mapped, offset, length)
+
+            if entry:
+                yield entry
+
+    @staticmethod
+    def _entry_row(entry: HlaDatIndexEntry) -> tuple:
+        return entry.offset, entry.length, entry.id, entry.name, entry.type
+
+    @staticmethod
+    def _entry_from_row(row: List[str]) -> HlaDatIndexEntry:
+        offset, length, id, name, type = row
+        return HlaDatIndexEntry(int(offset), int(length), id, name, type)
+
+    @staticmethod
+    def __iter_records(mapped: mmap.mmap) -> Iterator[tuple]:
+        pos = 0 if mapped[:2] == b'ID' else mapped.find(b'\nID') + 1
+
+        if pos == 0 and mapped[:2] != b'ID':
+            return
+
+        while True:
+            end = mapped.find(b'\n//', pos)
+            end = end + 1 if end >= 0 else len(mapped)
+
+            yield pos, end - pos
+
+            pos = mapped.find(b'\nID', end)
+
+            if pos < 0:
+                break
+
+            pos += 1
+
+    @classmethod
+    def __create_entry(cls, mapped: mmap.mmap, offset: int, length: int) -> Union[HlaDatIndexEntry, None]:
+        id_match = cls.__id_regex.search(mapped, offset, offset + length)
+        name_match = cls.__name_regex.search(mapped, offset, offset + length)
+
+        if not id_match or not name_match:
+            return None
+
+        id = id_match.group(1).decode()
+        name = name_match.group(1).decode()
+
+        return HlaDatIndexEntry(offset, length, id, name, name.split('*')[0])
+
+
+class HlaDatIndexEntry:
+    def __init__(self, offset: int, length: int, id: str, name: str, type: str) -> None:
+        self.__offset = offset
+        self.__length = length
+        self.__id = id
+        self.__name = name
+        self.__type = type
+
+    @property
+    def offset(self) -> int:
+        return self.__offset
+
+    @property
+    def length(self) -> int:
+        return self.__length
+
+    @property
+    def id(self) -> str:
+        return self.__id
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def type(self) -> str:
+        return self.__type
+
+
+class HlaFastaIndex(HlaFileIndex):
+    """Faidx like index of a fasta file, written as `<fasta>.hfai`.
+
+    Every entry has, as in a samtools `.fai`, the number of bases of the
+    sequence, the byte offset of its first line and its line width in bases
+    and bytes, plus the byte size of the sequence lines and the allele name.
+    """
+
+    SUFFIX = '.hfai'
+    MAGIC = '#hla-fasta-index'
+
+    __id_regex = re.compile(rb'>HLA:(\w+)')
+    __name_regex = re.compile(rb'\w+\*[\w:]+')
+
+    def __init__(self, size: int, mtime_ns: int, sha1: str, entries: List[HlaFastaIndexEntry]) -> None:
+        super().__init__(size, mtime_ns, sha1, entries)
+        self.__by_id = None
+
+    def find(self, ids: Iterable[str]) -> List[HlaFastaIndexEntry]:
+        """Entries of the given ids, sorted by offset so they are read with
+        forward seeks only. For a repeated id the last record wins.
+        """
+
+        if self.__by_id is None:
+            self.__by_id = Dict[HlaFastaIndexEntry]((entry.id, entry) for entry in self.entries)
+
+        entries = List[HlaFastaIndexEntry](
+            self.__by_id[id] for id in set(ids) if id in self.__by_id
+        )
+        entries.sort(key=lambda entry: entry.offset)
+
+        return entries
+
+    @classmethod
+    def _iter_entries(cls, mapped: mmap.mmap) -> Iterator[HlaFastaIndexEntry]:
+        pos = 0 if mapped[:1] == b'>' else mapped.find(b'\n>') + 1
+
+        if pos == 0 and mapped[:1] != b'>':
+            return
+
+        while True:
+            header_end = mapped.find(b'\n', pos)
+            header_end = header_end if header_end >= 0 else len(mapped)
+            seq_start = min(header_end + 1, len(mapped))
+
+            end = mapped.find(b'\n>', header_end)
+            end = end + 1 if end >= 0 else len(mapped)
+
+            entry = cls.__create_entry(mapped[pos:header_end], mapped[seq_start:end], seq_start)
+
+            if entry:
+                yield entry
+
+            if end == len(mapped):
+                break
+
+            pos = end
+
+    @staticmethod
+    def _entry_row(entry: HlaFastaIndexEntry) -> tuple:
+        return (entry.id, entry.name, entry.length, entry.offset, entry.line_bases,
+                entry.line_bytes, entry.size)
+
+    @staticmethod
+    def _entry_from_row(row: List[str]) -> HlaFastaIndexEntry:
+        id, name, length, offset, line_bases, line_bytes, size = row
+        return HlaFastaIndexEntry(
+            id, name, int(length), int(offset), int(line_bases), int(line_bytes), int(size)
+        )
+
+    @classmethod
+    def __create_entry(cls, header: bytes, seq_lines: bytes, offset: int) -> Union[HlaFastaIndexEntry, None]:
+        id_match = cls.__id_regex.search(header)
+        name_match = cls.__name_regex.search(header)
+
+        if not id_match or not name_match:
+            return None
+
+        line_end = seq_lines.find(b'\n')
+        line_bytes = line_end + 1 if line_end >= 0 else len(seq_lines)
+        line_bases = len(seq_lines[:line_bytes].rstrip(b'\r\n'))
+        length = len(seq_lines) - seq_lines.count(b'\n') - seq_lines.count(b'\r')
+
+        return HlaFastaIndexEntry(
+            id_match.group(1).decode(),
+            f'HLA-{name_match.group().decode()}',
+            length,
+            offset,
+            line_bases,
+            line_bytes,
+            len(seq_lines)
+        )
+
+
+class HlaFastaIndexEntry:
+    def __init__(self, id: str, name: str, length: int, offset: int, line_bases: int,
+                 line_bytes: int, size: int) -> None:
+        self.__id = id
+        self.__name = name
+        self.__length = length
+        self.__offset = offset
+        self.__line_bases = line_bases
+        self.__line_bytes = line_bytes
+        self.__size = size
+
+    @property
+    def id(self) -> str:
+        return self.__id
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def type(self) -> str:
+        return self.__name.split('*')[0]
+
+    @property
+    def length(self) -> int:
+        return self.__length
+
+    @property
+    def offset(self) -> int:
+        return self.__offset
+
+    @property
+    def line_bases(self) -> int:
+        return self.__line_bases
+
+    @property
+    def line_bytes(self) -> int:
+        return self.__line_bytes
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+
+class HlaImgtIndex(HlaFileIndex):
+    """Index with the byte offset of every allele of an imgt file, written as
+    `<imgt>.idx`.
+    """
+
+    SUFFIX = '.idx'
+    MAGIC = '#hla-imgt-index'
+    VERSION = '2'
+
+    def find(self, names: Iterable[str]) -> Iterator[HlaImgtIndexEntry]:
+        names = set(names)
+
+        for entry in self.entries:
+            if entry.name in names:
+                yield entry
+
+    @classmethod
+    def _iter_entries(cls, mapped: mmap.mmap) -> Iterator[HlaImgtIndexEntry]:
+        pos = 0 if mapped[:1] == b'#' else mapped.find(b'\n#') + 1
+
+        if pos == 0 and mapped[:1] != b'#':
+            return
+
+        while True:
+            header_end = mapped.find(b'\n', pos)
+            header_end = header_end if header_end >= 0 else len(mapped)
+
+            end = mapped.find(b'\n#', header_end)
+            end = end + 1 if end >= 0 else len(mapped)
+
+            name = mapped[pos + 1:header_end].decode().rstrip('\r')
+
+            if name:
+                yield HlaImgtIndexEntry(pos, end - pos, name)
+
+            if end == len(mapped):
+                break
+
+            pos = end
+
+    @staticmethod
+    def _entry_row(entry: HlaImgtIndexEntry) -> tuple:
+        return entry.offset, entry.length, entry.name
+
+    @staticmethod
+    def _entry_from_row(row: List[str]) -> HlaImgtIndexEntry:
+        offset, length, name = row
+        return HlaImgtIndexEntry(int(offset), int(length), name)
+
+
+class HlaImgtIndexEntry:
+    def __init__(self, offset: int, length: int, name: str) -> None:
+        self.__offset = offset
+        self.__length = length
+        self.__name = name
+
+    @property
+    def offset(self) -> int:
+        return self.__offset
+
+    @property
+    def length(self) -> int:
+        return self.__length
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def type(self) -> str:
+        return self.__name.split('*')[0]
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator, Tuple, Union
+
+from compression import is_compressed, open_text
+from hla import Hla, HlaCollection, HlaReader, StrHlaParser
+from hla_cds import HlaCdsView
+from hla_index import HlaFastaIndex, HlaImgtIndex
+from hla_strategy.parser import StrHlaParserFromFasta, StrHlaParserFromImgt
+from hla_strategy.reader import HlaContentReaderFromFasta, HlaContentReaderFromImgt
+from super_collections import Dict, List
+
+
+class HlaFastaMerger:
+    """Sets the sequence of every exon of the dat alleles to the sequence of
+    the allele with the same id and locus in a fasta file.
+
+    Only the sequences of those alleles are read, seeking to them through a
+    HlaFastaIndex built on the first run. Compressed files can not be
+    seeked, so they are streamed, parsing only the records of those alleles.
+
+    `merge` is split in `prepare`, which builds the index and needs no dat
+    allele, `load`, which only reads, and `apply`, which only sets the
+    sequences, so each step can run as soon as its inputs are ready.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.__path = path
+        self.__index = None
+
+    def merge(self, hla_collections: Iterable[HlaCollection]) -> int:
+        """Returns the number of dat alleles that took a fasta sequence."""
+
+        return self.apply(self.load(hla_collections))
+
+    def prepare(self):
+        if not is_compressed(self.path):
+            self.__get_index()
+
+    def load(self, hla_collections: Iterable[HlaCollection]) -> List[Tuple[Hla, str]]:
+        hlas = Dict[Hla]()
+        seqs = List[Tuple[Hla, str]]()
+
+        for hla_collection in hla_collections:
+            hlas.update(hla_collection.hlas)
+
+        for id, type, seq in self.__iter_seqs(hlas):
+            hla = hlas[id]
+
+            if type == hla.type and seq:
+                seqs.append((hla, seq))
+
+        return seqs
+
+    @staticmethod
+    def apply(seqs: Iterable[Tuple[Hla, str]], cds_views: Union[Dict[HlaCdsView], None] = None) -> int:
+        """Sets the sequences, sliced with the cds ranges of `cds_views`, by
+        locus type, when given.
+        """
+
+        merged = set()
+
+        for hla, seq in seqs:
+            if cds_views is None:
+                hla.update_exons_seq(seq)
+            else:
+                hla.update_exons_seq(seq, cds_views[hla.type].ranges(hla.id))
+
+            merged.add(hla.id)
+
+        return len(merged)
+
+    def __get_index(self) -> HlaFastaIndex:
+        if self.__index is None:
+            self.__index = HlaFastaIndex.get(self.path)
+
+        return self.__index
+
+    def __iter_seqs(self, hlas: Dict[Hla]) -> Iterator[Tuple[str, str, str]]:
+        if is_compressed(self.path):
+            yield from self.__iter_seqs_streamed(hlas)
+            return
+
+        entries = self.__get_index().find(hlas.keys())
+
+        with open(self.path, 'rb') as file:
+            for entry in entries:
+                file.seek(entry.offset)
+                seq_lines = file.read(entry.size).decode().replace('\r\n', '\n')
+
+                yield entry.id, entry.type, StrHlaParserFromFasta.parse_seq(seq_lines)
+
+    def __iter_seqs_streamed(self, hlas: Dict[Hla]) -> Iterator[Tuple[str, str, str]]:
+        with open_text(self.path) as file:
+            for hla_content in HlaContentReaderFromFasta.iter_hla_contents(file):
+                id = StrHlaParserFromFasta.peek_id(hla_content)
+
+                if id not in hlas:
+                    continue
+
+                hla, __ = StrHlaParserFromFasta.parse(hla_content)
+
+                yield id, hla.type, hla.seq
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+
+class HlaImgtMerger:
+    """Replaces the dat alleles by the allele with the same name in a base
+    imgt file.
+
+    The base file is never parsed as a whole: an HlaImgtIndex, built on the
+    first run, maps the allele names to their records, and only the records
+    of dat allele names are read and parsed, in `workers` processes when
+    more than one. Compressed files can not be seeked, so they are
+    streamed, parsing only those records. As in HlaFastaMerger, `merge` is
+    split in `prepare`, `load` and `apply`.
+    """
+
+    def __init__(self, path: str, workers: int = 1) -> None:
+        self.__path = path
+        self.__workers = workers
+        self.__index = None
+
+    def merge(self, hla_collections: Iterable[HlaCollection]) -> int:
+        """Returns the number of dat alleles that were replaced."""
+
+        return self.apply(self.load(hla_collections))
+
+    def prepare(self):
+        if not is_compressed(self.path):
+            self.__get_index()
+
+    def load(self, hla_collections: Iterable[HlaCollection]) -> List[Tuple[HlaCollection, str, Hla]]:
+        targets = Dict[List[tuple]]()
+        replacements = List[Tuple[HlaCollection, str, Hla]]()
+
+        for hla_collection in hla_collections:
+            for id, hla in hla_collection.hlas.items():
+                targets.setdefault(hla.name, List[tuple]()).append((hla_collection, id))
+
+        reader = HlaReader(HlaContentReaderFromImgt, StrHlaParser(StrHlaParserFromImgt), self.workers)
+
+        for imgt_hla in reader.parse_hla_contents(self.__iter_hla_contents(targets)):
+            for hla_collection, id in targets[imgt_hla.name]:
+                replacements.append((hla_collection, id, imgt_hla))
+
+        return replacements
+
+    @staticmethod
+    def apply(replacements: Iterable[Tuple[HlaCollection, str, Hla]]) -> int:
+        merged = set()
+
+        for hla_collection, id, imgt_hla in replacements:
+            hla_collection.hlas[id] = imgt_hla
+            merged.add((hla_collection.type, id))
+
+        return len(merged)
+
+    def __get_index(self) -> HlaImgtIndex:
+        if self.__index is None:
+            self.__index = HlaImgtIndex.get(self.path)
+
+        return self.__index
+
+    def __iter_hla_contents(self, targets: Dict[List[tuple]]) -> Iterator[str]:
+        if is_compressed(self.path):
+            with open_text(self.path) as file:
+                for hla_content in HlaContentReaderFromImgt.iter_hla_contents(file):
+                    if StrHlaParserFromImgt.peek_name(hla_content) in targets:
+                        yield hla_content
+            return
+
+        entries = self.__get_index().find(targets.keys())
+
+        with open(self.path, 'rb') as file:
+            for entry in entries:
+                file.seek(entry.offset)
+                yield file.read(entry.length).decode().replace('\r\n', '\n')
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def workers(self) -> int:
+        return self.__workers
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import resource
+import sys
+import time
+from typing import Iterable, Iterator, Union
+
+from super_collections import Dict, List
+
+
+class HlaMetrics:
+    """Wall time, cpu time, throughput and peak memory of the stages of an
+    extraction.
+
+    Stages can be entered many times and nested, as the read, filter and
+    parse generators of HlaReader pulling from each other record by record:
+    only the innermost active stage is charged, so every stage gets its own
+    time only. The cpu time is the one of the whole process, so it includes
+    its threads but not the worker processes. With `profile`, every stage
+    also runs its own cProfile profiler.
+    """
+
+    def __init__(self, profile: bool = False) -> None:
+        self.__profile = profile
+        self.__stages = Dict[HlaStageMetrics]()
+        self.__active = List[HlaStageMetrics]()
+
+    def stage(self, name: str) -> HlaStageMetrics:
+        stage = self.__stages.get(name)
+
+        if stage is None:
+            stage = HlaStageMetrics(self, name, cProfile.Profile() if self.profile else None)
+            self.__stages[name] = stage
+
+        return stage
+
+    def measure(self, name: str, items: Iterable, size=None) -> Iterator:
+        """Yields `items`, charging to the stage the time spent producing
+        them and counting them, and their `size`, as its records and bytes.
+        """
+
+        return self.__measure(self.stage(name), iter(items), size)
+
+    @staticmethod
+    def __measure(stage: HlaStageMetrics, items: Iterator, size) -> Iterator:
+        while True:
+            with stage:
+                item = next(items, _END)
+
+            if item is _END:
+                return
+
+            stage.records += 1
+
+            if size:
+                stage.bytes += size(item)
+
+            yield item
+
+    def _enter(self, stage: HlaStageMetrics):
+        now = time.perf_counter(), time.process_time()
+
+        if self.__active:
+            self.__active[-1]._pause(*now)
+
+        self.__active.append(stage)
+        stage._resume(*now)
+
+    def _exit(self, stage: HlaStageMetrics):
+        now = time.perf_counter(), time.process_time()
+
+        stage._pause(*now)
+        self.__active.pop()
+
+        if self.__active:
+            self.__active[-1]._resume(*now)
+
+    def hottest(self) -> Union[HlaStageMetrics, None]:
+        return max(self.__stages.values(), key=lambda stage: stage.wall, default=None)
+
+    def dump_profile(self, path: str) -> Union[HlaStageMetrics, None]:
+        """Saves the cProfile stats of the stage with the longest wall time,
+        to be read with `pstats`, and returns that stage.
+        """
+
+        stage = self.hottest()
+
+        if stage and stage.profiler:
+            stage.profiler.dump_stats(path)
+
+        return stage
+
+    def to_dict(self) -> dict:
+        return {
+            'stages': [stage.to_dict() for stage in self.__stages.values()],
+            'peak_rss': self.rss_peak()
+        }
+
+    def save_json(self, path: str):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def report(self) -> str:
+        lines = List[str]([
+            f'{"stage":<12}{"wall s":>10}{"cpu s":>10}{"records":>10}{"records/s":>12}'
+            f'{"MiB/s":>10}{"failed":>8}{"peak MiB":>10}'
+        ])
+
+        for stage in self.__stages.values():
+            records_per_sec = stage.records_per_sec
+            bytes_per_sec = stage.bytes_per_sec
+
+            lines.append(
+                f'{stage.name:<12}{stage.wall:>10.3f}{stage.cpu:>10.3f}{stage.records:>10}'
+                f'{records_per_sec or 0:>12.0f}{(bytes_per_sec or 0) / 2 ** 20:>10.1f}'
+                f'{stage.failed:>8}{stage.peak_rss / 2 ** 20:>10.1f}'
+            )
+
+        return '\n'.join(lines)
+
+    @staticmethod
+    def rss_peak() -> int:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    @property
+    def profile(self) -> bool:
+        return self.__profile
+
+    @property
+    def stages(self) -> List[HlaStageMetrics]:
+        return List[HlaStageMetrics](self.__stages.values())
+
+
+class HlaStageMetrics:
+    """Accumulated metrics of one stage, entered as a context manager every
+    time the stage runs. Callers count the records, bytes and records that
+    failed validation.
+    """
+
+    def __init__(self, metrics: HlaMetrics, name: str,
+                 profiler: Union[cProfile.Profile, None] = None) -> None:
+        self.__metrics = metrics
+        self.__name = name
+        self.__profiler = profiler
+        self.__wall_start = 0.0
+        self.__cpu_start = 0.0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.records = 0
+        self.bytes = 0
+        self.failed = 0
+        self.peak_rss = 0
+
+    def __enter__(self) -> HlaStageMetrics:
+        self.__metrics._enter(self)
+        return self
+
+    def __exit__(self, *args):
+        self.__metrics._exit(self)
+
+    def _resume(self, wall: float, cpu: float):
+        self.__wall_start = wall
+        self.__cpu_start = cpu
+
+        if self.__profiler:
+            self.__profiler.enable()
+
+    def _pause(self, wall: float, cpu: float):
+        if self.__profiler:
+            self.__profiler.disable()
+
+        self.wall += wall - self.__wall_start
+        self.cpu += cpu - self.__cpu_start
+        self.peak_rss = max(self.peak_rss, HlaMetrics.rss_peak())
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'records': self.records,
+            'bytes': self.bytes,
+            'failed': self.failed,
+            'records_per_sec': self.records_per_sec,
+            'bytes_per_sec': self.bytes_per_sec,
+            'peak_rss': self.peak_rss
+        }
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def profiler(self) -> Union[cProfile.Profile, None]:
+        return self.__profiler
+
+    @property
+    def records_per_sec(self) -> Union[float, None]:
+        return self.records / self.wall if self.records and self.wall else None
+
+    @property
+    def bytes_per_sec(self) -> Union[float, None]:
+        return self.bytes / self.wall if self.bytes and self.wall else None
+
+
+_END = object()
@@ -1,64 +1,102 @@
 import re
 
-from operator import itemgetter
-from typing import Tuple
+from typing import Iterable, Iterator, Tuple, Union
 
-from hla import Hla, HlaExon, HlaStrParserStrategy, StrHlaParserStrategy
+from hla import Hla, HlaExon, HlaLazySeq, HlaStrParserStrategy, StrHlaParserStrategy
 from super_collections import List
-from util import break_in_lines
+from util import wrap_lines
+
+
+def _exon_seqs(hla: Hla, qt_exons: int) -> Iterator[Union[str, None]]:
+    exons_by_number = hla.exons_by_number
+
+    for number in range(1, qt_exons + 1):
+        exon = exons_by_number.get(number)
+        yield exon.seq if exon is not None else None
 
 
 class HlaStrParserAsImgt(HlaStrParserStrategy):
     @classmethod
     def parse(cls, hla: Hla, *args, **kwargs) -> str:
-        exons_max_len, qt_exons = itemgetter(
-            'exons_max_len', 'qt_exons'
-        )(kwargs)
+        pieces = List[str]()
+        cls.parse_into(hla, pieces, *args, **kwargs)
+        return ''.join(pieces)
 
-        result = f'#{hla.name}\n'
+    @classmethod
+    def parse_into(cls, hla: Hla, pieces: list, *args, **kwargs):
+        exon_seqs = _exon_seqs(hla, kwargs['qt_exons'])
+        cls.parse_exons_into(hla.name, exon_seqs, pieces, *args, **kwargs)
+
+    @classmethod
+    def parse_exons_into(cls, name: str, exon_seqs: Iterable[Union[str, None]], pieces: list,
+                         *args, **kwargs):
+        exons_max_len = kwargs['exons_max_len']
 
-        for i in range(0, qt_exons):
-            exon = hla.get_exon_by_number(i + 1)
+        pieces.append(f'#{name}\n')
 
-            result += f'>EX{i + 1}\n'
+        for i, exon_seq in enumerate(exon_seqs):
+            pieces.append(f'>EX{i + 1}\n')
 
-            if not exon.phantom:
-                exon_seq = exon.seq.upper()
+            if exon_seq is not None:
+                exon_seq = exon_seq.upper()
             else:
                 exon_seq = 'N' * exons_max_len[i]
 
-            result += f'{break_in_lines(exon_seq, 60)}\n'
-
-        return result
+            wrap_lines(exon_seq, 60, pieces)
 
 
 class HlaStrParserAsImgtNotEmptyExon(HlaStrParserStrategy):
     @classmethod
     def parse(cls, hla: Hla, *args, **kwargs) -> str:
-        exons_max_len, qt_exons = itemgetter(
-            'exons_max_len', 'qt_exons'
-        )(kwargs)
+        pieces = List[str]()
+        cls.parse_into(hla, pieces, *args, **kwargs)
+        return ''.join(pieces)
+
+    @classmethod
+    def parse_into(cls, hla: Hla, pieces: list, *args, **kwargs):
+        exon_seqs = _exon_seqs(hla, kwargs['qt_exons'])
+        cls.parse_exons_into(hla.name, exon_seqs, pieces, *args, **kwargs)
 
-        result = f'#{hla.name}\n'
+    @classmethod
+    def parse_exons_into(cls, name: str, exon_seqs: Iterable[Union[str, None]], pieces: list,
+                         *args, **kwargs):
+        exons_max_len = kwargs['exons_max_len']
 
-        for i in range(0, qt_exons):
-            exon = hla.get_exon_by_number(i + 1)
+        pieces.append(f'#{name}\n')
 
-            if not exon.phantom:
-                exon_seq = exon.seq.upper()
+        for i, exon_seq in enumerate(exon_seqs):
+            if exon_seq is not None:
+                exon_seq = exon_seq.upper()
             else:
                 exon_seq = 'N' * exons_max_len[i]
 
             if not exon_seq:
                 continue
 
-            result += f'>EX{i + 1}\n'
-            result += f'{break_in_lines(exon_seq, 60)}\n'
+            pieces.append(f'>EX{i + 1}\n')
+            wrap_lines(exon_seq, 60, pieces)
+
 
-        return result
+class StrHlaParserDatStrategy(StrHlaParserStrategy):
+    """Base of the dat parsers, which read the allele id and name of a
+    record from its ID and DE lines.
+    """
 
+    __id_regex = re.compile(r'^ID {3}(\w+)', re.MULTILINE)
+    __name_regex = re.compile(r'^DE {3}(.+?),', re.MULTILINE)
 
-class StrHlaParserFromDat(StrHlaParserStrategy):
+    @classmethod
+    def peek_name(cls, text: str) -> Union[str, None]:
+        match = cls.__name_regex.search(text)
+        return match.group(1) if match else None
+
+    @classmethod
+    def peek_id(cls, text: str) -> Union[str, None]:
+        match = cls.__id_regex.search(text)
+        return match.group(1) if match else None
+
+
+class StrHlaParserFromDat(StrHlaParserDatStrategy):
     @classmethod
     def parse(cls, text: str, *args, **kwargs) -> Tuple[Hla, bool]:
         id = cls._extract_id(text)
@@ -72,17 +110,17 @@ class StrHlaParserFromDat(StrHlaParserStrategy):
 
     @staticmethod
     def _extract_id(text: str) -> str:
-        regex = re.compile('(?<=^ID {3})\w+', re.MULTILINE)
+        regex = re.compile(r'(?<=^ID {3})\w+', re.MULTILINE)
         return regex.findall(text)[0]
 
     @staticmethod
     def _extract_name(text: str) -> str:
-        regex = re.compile('(?<=^DE {3}).+?(?=,)', re.MULTILINE)
+        regex = re.compile(r'(?<=^DE {3}).+?(?=,)', re.MULTILINE)
         return regex.findall(text)[0]
 
     @staticmethod
     def _extract_seq(text: str) -> str:
-        regex = re.compile('(?<=\s)[atgc]{1,10}(?=\s)', re.MULTILINE)
+        regex = re.compile(r'(?<=\s)[atgc]{1,10}(?=\s)', re.MULTILINE)
         seq_chunks = List[str](regex.findall(text))
 
         try:
@@ -100,7 +138,7 @@ class StrHlaParserFromDat(StrHlaParserStrategy):
     def _extract_exons(text: str, seq: str) -> List[HlaExon]:
         exons = List[HlaExon]()
         regex = re.compile(
-            '(?<=FT {3}exon {12})(\d+)\.\.(\d+)\sFT {19}.number=\"(\d+)',
+            r'(?<=FT {3}exon {12})(\d+)\.\.(\d+)\sFT {19}.number="(\d+)',
             re.MULTILINE
         )
         exons_data = regex.findall(text)
@@ -118,7 +156,170 @@ class StrHlaParserFromDat(StrHlaParserStrategy):
         return exons
 
 
+class StrHlaParserSinglePassFromDat(StrHlaParserDatStrategy):
+    """Walks the record once, dispatching on the EMBL line prefix, instead
+    of running one regex per field over the whole record.
+    """
+
+    __id_regex = re.compile(r'ID {3}(\w+)')
+    __name_regex = re.compile(r'DE {3}(.+?),')
+    __exon_regex = re.compile(r'FT {3}exon {12}(\d+)\.\.(\d+)$')
+    __exon_number_regex = re.compile(r'FT {19}.number="(\d+)')
+    __seq_regex = re.compile(r'[atgc]*')
+    __seq_chunk_regex = re.compile(r'[atgc]{1,10}')
+
+    @classmethod
+    def parse(cls, text: str, *args, **kwargs) -> Tuple[Hla, bool]:
+        header, seq_text = cls._split_seq(text)
+        id, name, exons = cls._parse_header(header)
+        seq = cls._extract_seq(seq_text)
+
+        for exon in exons:
+            exon.seq = seq
+
+        valid = bool(id and name and seq and exons)
+
+        return Hla(id, name, seq, exons), valid
+
+    @staticmethod
+    def _split_seq(text: str) -> Tuple[str, str]:
+        """Splits the record at its SQ line, before the sequence lines."""
+
+        sq = text.find('\nSQ')
+
+        if sq < 0:
+            return text, ''
+
+        return text[:sq], text[sq + 1:]
+
+    @classmethod
+    def _parse_header(cls, header: str) -> Tuple[str, str, List[HlaExon]]:
+        id = ''
+        name = ''
+        exons = List[HlaExon]()
+        exon_range = None
+
+        for line in header.split('\n'):
+            prefix = line[:2]
+
+            if prefix == 'FT':
+                if exon_range:
+                    match = cls.__exon_number_regex.match(line)
+
+                    if match:
+                        exon = HlaExon(exon_range)
+                        exon.number = match.group(1)
+                        exons.append(exon)
+
+                match = cls.__exon_regex.match(line)
+                exon_range = None
+
+                if match:
+                    exon_range = range(int(match.group(1)) - 1, int(match.group(2)))
+
+                continue
+
+            exon_range = None
+
+            if prefix == 'ID':
+                if not id:
+                    match = cls.__id_regex.match(line)
+                    id = match.group(1) if match else ''
+            elif prefix == 'DE':
+                if not name:
+                    match = cls.__name_regex.match(line)
+                    name = match.group(1) if match else ''
+
+        return id, name, exons
+
+    @classmethod
+    def _extract_seq(cls, seq_text: str) -> str:
+        return cls._join_seq_lines(
+            List[str](line for line in seq_text.split('\n') if line[:2] == '  ')
+        )
+
+    @classmethod
+    def _join_seq_lines(cls, lines: List[str]) -> str:
+        seq = ''.join([''.join(line.split()[:-1]) for line in lines])
+
+        if cls.__seq_regex.fullmatch(seq):
+            return seq
+
+        seq_chunks = List[str]([
+            chunk for line in lines for chunk in line.split()
+            if cls.__seq_chunk_regex.fullmatch(chunk)
+        ])
+
+        if seq_chunks and len(seq_chunks[0]) != 10:
+            first_valid_seq_chunk = seq_chunks.find_index(
+                lambda seq_chunk, __, ___: len(seq_chunk) == 10
+            )
+            seq_chunks = seq_chunks[first_valid_seq_chunk:]
+
+        return ''.join(seq_chunks)
+
+
+class StrHlaParserLazyFromDat(StrHlaParserSinglePassFromDat):
+    """Parses only the ID, DE and FT lines up front. Records read from a
+    file, as HlaRecords of the mmap reader or the dat index, keep only where
+    their sequence lines are, read back the first time the allele or exon
+    sequences are read, so alleles given a fasta sequence, replaced from a
+    base imgt file or never written do not pay for their sequence. Other
+    records have their sequence extracted right away.
+
+    Sequence lines in the usual layout, bases and a trailing position, are
+    joined in a single `translate` instead of line by line. A record read
+    from a file is valid with at least one sequence line, as the sequence
+    is not extracted to check it.
+    """
+
+    __seq_line_regex = re.compile(r'^ +[atgc]+\s', re.MULTILINE)
+    __seq_layout_regex = re.compile(r'(?:  [atgc ]* \d+\n)*(?:  [atgc ]* \d+)?')
+    __seq_layout_chars = str.maketrans('', '', ' \n0123456789')
+
+    @classmethod
+    def parse(cls, text: str, *args, **kwargs) -> Tuple[Hla, bool]:
+        header, seq_text = cls._split_seq(text)
+        id, name, exons = cls._parse_header(header)
+        path = getattr(text, 'path', None)
+
+        if path is None or not seq_text:
+            seq = cls._extract_seq(seq_text)
+            has_seq = bool(seq)
+        else:
+            offset = text.offset + len(text[:len(header) + 1].encode())
+            seq = HlaLazySeq((path, offset, len(seq_text.encode())), cls._read_seq)
+            has_seq = bool(cls.__seq_line_regex.search(seq_text))
+
+        for exon in exons:
+            exon.seq = seq
+
+        valid = bool(id and name and has_seq and exons)
+
+        return Hla(id, name, seq, exons), valid
+
+    @classmethod
+    def _extract_seq(cls, seq_text: str) -> str:
+        lines = seq_text[seq_text.find('\n') + 1:]
+
+        if cls.__seq_layout_regex.fullmatch(lines):
+            return lines.translate(cls.__seq_layout_chars)
+
+        return super()._extract_seq(seq_text)
+
+    @classmethod
+    def _read_seq(cls, source: Tuple[str, int, int]) -> str:
+        path, offset, length = source
+
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            return cls._extract_seq(file.read(length).decode())
+
+
 class StrHlaParserFromFasta(StrHlaParserStrategy):
+    __id_regex = re.compile(r'^>HLA:(\w+)', re.MULTILINE)
+    __name_regex = re.compile(r'\w+\*[\w:]+')
+
     @classmethod
     def parse(cls, text: str, *args, **kwargs) -> Tuple[Hla, bool]:
         id = cls._extract_id(text)
@@ -129,23 +330,43 @@ class StrHlaParserFromFasta(StrHlaParserStrategy):
 
         return Hla(id, name, seq, List()), valid
 
+    @classmethod
+    def peek_name(cls, text: str) -> Union[str, None]:
+        match = cls.__name_regex.search(text)
+        return f'HLA-{match.group()}' if match else None
+
+    @classmethod
+    def peek_id(cls, text: str) -> Union[str, None]:
+        match = cls.__id_regex.search(text)
+        return match.group(1) if match else None
+
+    @classmethod
+    def parse_seq(cls, text: str) -> str:
+        """Sequence of a record, or of its sequence lines alone, as the
+        fasta index points to them.
+        """
+
+        return cls._extract_seq(text)
+
     @staticmethod
     def _extract_id(text: str) -> str:
-        regex = re.compile('(?<=>HLA:)\w+', re.MULTILINE)
+        regex = re.compile(r'(?<=>HLA:)\w+', re.MULTILINE)
         return regex.findall(text)[0]
 
     @staticmethod
     def _extract_name(text: str) -> str:
-        regex = re.compile('\w+\*[\w:]+', re.MULTILINE)
+        regex = re.compile(r'\w+\*[\w:]+', re.MULTILINE)
         return f'HLA-{regex.findall(text)[0]}'
 
     @staticmethod
     def _extract_seq(text: str) -> str:
-        regex = re.compile('^[ATGC]+$', re.MULTILINE)
+        regex = re.compile(r'^[ATGC]+$', re.MULTILINE)
         return ''.join(regex.findall(text))
 
 
 class StrHlaParserFromImgt(StrHlaParserStrategy):
+    __name_regex = re.compile(r'^#(.+)$', re.MULTILINE)
+
     @classmethod
     def parse(cls, text: str, *args, **kwargs) -> Tuple[Hla, bool]:
         name = cls._extract_name(text)
@@ -157,14 +378,19 @@ class StrHlaParserFromImgt(StrHlaParserStrategy):
 
         return Hla(id, name, seq, exons), valid
 
+    @classmethod
+    def peek_name(cls, text: str) -> Union[str, None]:
+        match = cls.__name_regex.search(text)
+        return match.group(1) if match else None
+
     @staticmethod
     def _extract_name(text: str) -> str:
-        regex = re.compile('(?<=^#).+$', re.MULTILINE)
+        regex = re.compile(r'(?<=^#).+$', re.MULTILINE)
         return regex.findall(text)[0]
 
     @staticmethod
     def _extract_seq(text: str) -> str:
-        regex = re.compile('^[ATGCN]+$', re.MULTILINE)
+        regex = re.compile(r'^[ATGCN]+$', re.MULTILINE)
         return ''.join(regex.findall(text))
 
     @staticmethod
@@ -172,26 +398,26 @@ class StrHlaParserFromImgt(StrHlaParserStrategy):
         exons = List[HlaExon]()
 
         exons_data = text.split('\n>EX')[1:]
+        exons_seqs = List[str]()
         exon_start = 0
         exon_end = 0
 
-        seq = ''
-
         for exon_data in exons_data:
-            exon_data = exon_data.split('\n')
-
-            exon_number = exon_data[0]
-            exon_seq = ''.join(exon_data[1:]).replace('\n', '')
-            seq += exon_seq
+            exon_number, __, exon_seq = exon_data.partition('\n')
+            exon_seq = exon_seq.replace('\n', '')
+            exons_seqs.append(exon_seq)
 
             exon_start = exon_end
             exon_end += len(exon_seq)
 
             exon = HlaExon(range(exon_start, exon_end))
-
             exon.number = exon_number
-            exon.seq = seq
 
             exons.append(exon)
 
+        seq = ''.join(exons_seqs)
+
+        for exon in exons:
+            exon.seq = seq
+
         return exons
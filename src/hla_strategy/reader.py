@@ -1,21 +1,173 @@
-from io import TextIOWrapper
+from __future__ import annotations
+
+from io import TextIOWrapper, UnsupportedOperation
+import mmap
 import re
+from typing import Iterator, Union
+from weakref import WeakKeyDictionary
 
-from hla import HlaContentReaderStrategy
+from hla import HlaContentReaderStrategy, HlaRecord
 from super_collections import List
 
 
+class HlaContentScanner:
+    """Single pass, buffered scanner over the records of a text file.
+
+    A record starts at a line beginning with `start` and runs until the
+    line beginning with `stop` (excluded), or, when there is no `stop`,
+    until the next `start` line. Only the current record and one read
+    buffer are held in memory at a time.
+    """
+
+    BUFFER_SIZE = 1 << 20
+
+    __scanners = WeakKeyDictionary()
+
+    def __init__(self, file: TextIOWrapper, start: str, stop: Union[str, None] = None,
+                 buffer_size: int = BUFFER_SIZE) -> None:
+        self.__contents = self._scan(file, start, stop, buffer_size)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.__contents
+
+    def next_content(self) -> str:
+        return next(self.__contents, '')
+
+    @classmethod
+    def of(cls, file: TextIOWrapper, start: str, stop: Union[str, None] = None) -> HlaContentScanner:
+        scanner = cls.__scanners.get(file)
+
+        if not scanner:
+            scanner = cls(file, start, stop)
+            cls.__scanners[file] = scanner
+
+        return scanner
+
+    @classmethod
+    def _scan(cls, file: TextIOWrapper, start: str, stop: Union[str, None],
+               buffer_size: int) -> Iterator[str]:
+        end_marker = stop or start
+        hla_content = List[str]()
+        has_to_read = False
+        tail = ''
+
+        while True:
+            chunk = file.read(buffer_size)
+            block = tail + chunk
+
+            if chunk:
+                cut = block.rfind('\n') + 1
+                block, tail = block[:cut], block[cut:]
+
+            pos = 0
+
+            while True:
+                if not has_to_read:
+                    pos = cls.__find_line(block, start, pos)
+
+                    if pos < 0:
+                        break
+
+                    has_to_read = True
+                    end = cls.__find_line(block, end_marker, pos + 1)
+                else:
+                    end = cls.__find_line(block, end_marker, pos)
+
+                if end < 0:
+                    hla_content.append(block[pos:])
+                    break
+
+                hla_content.append(block[pos:end])
+                yield ''.join(hla_content)
+
+                hla_content = List[str]()
+                has_to_read = False
+                pos = end
+
+            if not chunk:
+                break
+
+        if hla_content:
+            yield ''.join(hla_content)
+
+    @staticmethod
+    def __find_line(block: str, marker: str, pos: int) -> int:
+        if (pos == 0 or block[pos - 1] == '\n') and block.startswith(marker, pos):
+            return pos
+
+        index = block.find(f'\n{marker}', pos)
+        return index + 1 if index >= 0 else -1
+
+
+class HlaContentMmapScanner(HlaContentScanner):
+    """Scanner that finds record boundaries directly in the memory mapped
+    file and decodes only the record being handed out. Streams that are not
+    backed by a file, as decompressed input, fall back to buffered reads.
+    Records are HlaRecords pointing back into the file, except for files
+    with CRLF line ends, detected on their first line, whose records are
+    translated to LF as text mode reads do.
+    """
+
+    @classmethod
+    def _scan(cls, file: TextIOWrapper, start: str, stop: Union[str, None],
+              buffer_size: int) -> Iterator[str]:
+        try:
+            fileno = file.fileno()
+        except UnsupportedOperation:
+            yield from super()._scan(file, start, stop, buffer_size)
+            return
+
+        start = start.encode()
+        end_marker = stop.encode() if stop else start
+
+        try:
+            mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return
+
+        with mapped:
+            view = memoryview(mapped)
+            newline = mapped.find(b'\n')
+            crlf = newline > 0 and mapped[newline - 1:newline] == b'\r'
+
+            try:
+                pos = cls.__find_line(mapped, start, 0)
+
+                while pos >= 0:
+                    end = cls.__find_line(mapped, end_marker, pos + 1)
+                    content_end = end if end >= 0 else len(mapped)
+                    content = str(view[pos:content_end], file.encoding)
+
+                    if crlf:
+                        yield content.replace('\r\n', '\n')
+                    else:
+                        yield HlaRecord(content, file.name, pos)
+
+                    if end < 0:
+                        break
+
+                    pos = cls.__find_line(mapped, start, end)
+            finally:
+                view.release()
+
+    @staticmethod
+    def __find_line(mapped: mmap.mmap, marker: bytes, pos: int) -> int:
+        at_line_start = pos == 0 or mapped[pos - 1:pos] == b'\n'
+
+        if at_line_start and mapped[pos:pos + len(marker)] == marker:
+            return pos
+
+        index = mapped.find(b'\n' + marker, pos)
+        return index + 1 if index >= 0 else -1
+
+
 class HlaContentReaderFromDat(HlaContentReaderStrategy):
     @classmethod
     def get_hla_content(cls, file: TextIOWrapper) -> str:
         hla_content = ''
-        last_file_pos = -1
         has_to_read = False
 
-        while file.tell() != last_file_pos:
-            last_file_pos = file.tell()
-            line = file.readline()
-
+        for line in iter(file.readline, ''):
             if line.startswith('ID'):
                 has_to_read = True
 
@@ -31,63 +183,65 @@ class HlaContentReaderFromDat(HlaContentReaderStrategy):
 class HlaContentReaderFromFasta(HlaContentReaderStrategy):
     @classmethod
     def get_hla_content(cls, file: TextIOWrapper) -> str:
-        hla_content = ''
-        last_file_pos = -1
-        has_to_read = False
-
-        while file.tell() != last_file_pos:
-            last_file_pos = file.tell()
-            line = file.readline()
+        return HlaContentScanner.of(file, '>').next_content()
 
-            if line.startswith('>'):
-                if has_to_read:
-                    break
-
-                has_to_read = True
-
-            if has_to_read:
-                hla_content += line
-
-        return hla_content
+    @classmethod
+    def iter_hla_contents(cls, file: TextIOWrapper) -> Iterator[str]:
+        return iter(HlaContentScanner(file, '>'))
 
 
 class HlaContentReaderQuickFromDat(HlaContentReaderStrategy):
-    __hlas_contents = None
+    __hlas_contents = WeakKeyDictionary()
+    __regex = re.compile('\n//\n?', re.MULTILINE)
 
     @classmethod
     def get_hla_content(cls, file: TextIOWrapper) -> str:
-        regex = re.compile('\n//\n?', re.MULTILINE)
+        hlas_contents = cls.__hlas_contents.get(file)
 
-        if not cls.__hlas_contents:
+        if hlas_contents is None:
             try:
-                cls.__hlas_contents = iter(regex.split(file.read()))
+                hlas_contents = iter(cls.__regex.split(file.read()))
             except:
                 return ''
 
-        try:
-            return next(cls.__hlas_contents)
-        except:
-            return ''
+            cls.__hlas_contents[file] = hlas_contents
+
+        return next(hlas_contents, '')
+
+    @classmethod
+    def iter_hla_contents(cls, file: TextIOWrapper) -> Iterator[str]:
+        for hla_content in cls.__regex.split(file.read()):
+            if not hla_content:
+                return
+
+            yield hla_content
 
 
 class HlaContentReaderFromImgt(HlaContentReaderStrategy):
     @classmethod
     def get_hla_content(cls, file: TextIOWrapper) -> str:
-        hla_content = ''
-        last_file_pos = -1
-        has_to_read = False
+        return HlaContentScanner.of(file, '#').next_content()
 
-        while file.tell() != last_file_pos:
-            last_file_pos = file.tell()
-            line = file.readline()
+    @classmethod
+    def iter_hla_contents(cls, file: TextIOWrapper) -> Iterator[str]:
+        return iter(HlaContentScanner(file, '#'))
 
-            if line.startswith('#'):
-                if has_to_read:
-                    break
 
-                has_to_read = True
+class HlaContentReaderBufferedFromDat(HlaContentReaderStrategy):
+    @classmethod
+    def get_hla_content(cls, file: TextIOWrapper) -> str:
+        return HlaContentScanner.of(file, 'ID', '//').next_content()
 
-            if has_to_read:
-                hla_content += line
+    @classmethod
+    def iter_hla_contents(cls, file: TextIOWrapper) -> Iterator[str]:
+        return iter(HlaContentScanner(file, 'ID', '//'))
 
-        return hla_content
+
+class HlaContentReaderMmapFromDat(HlaContentReaderStrategy):
+    @classmethod
+    def get_hla_content(cls, file: TextIOWrapper) -> str:
+        return HlaContentMmapScanner.of(file, 'ID', '//').next_content()
+
+    @classmethod
+    def iter_hla_contents(cls, file: TextIOWrapper) -> Iterator[str]:
+        return iter(HlaContentMmapScanner(file, 'ID', '//'))
@@ -1,6 +1,9 @@
 from io import TextIOWrapper
+from typing import Iterable
 
 from hla import HlaCollection, HlaCollectionWriterStrategy, HlaStrParser
+from hla_columnar import HlaColumnarCollection
+from super_collections import List
 
 
 class HlaCollectionWriterToImgt(HlaCollectionWriterStrategy):
@@ -14,3 +17,71 @@ class HlaCollectionWriterToImgt(HlaCollectionWriterStrategy):
                     qt_exons=hla_collection.qt_exons
                 )
             )
+
+
+class HlaCollectionWriterBufferedToImgt(HlaCollectionWriterStrategy):
+    """Streams the pieces of every allele into a large buffer flushed with
+    `writelines`, and writes the collections sorted by locus type.
+    """
+
+    BUFFER_PIECES = 1 << 16
+
+    @classmethod
+    def write_hla_collection(cls, file: TextIOWrapper, hla_collection: HlaCollection, parser: HlaStrParser) -> str:
+        pieces = List[str]()
+        exons_max_len = hla_collection.exons_max_len
+        qt_exons = hla_collection.qt_exons
+
+        for hla in hla_collection.hlas.values():
+            parser.parse_into(
+                hla,
+                pieces,
+                exons_max_len=exons_max_len,
+                qt_exons=qt_exons
+            )
+
+            if len(pieces) >= cls.BUFFER_PIECES:
+                file.writelines(pieces)
+                pieces.clear()
+
+        file.writelines(pieces)
+
+    @classmethod
+    def order(cls, hla_collections: Iterable[HlaCollection]) -> Iterable[HlaCollection]:
+        return sorted(hla_collections, key=lambda hla_collection: hla_collection.type)
+
+
+class HlaCollectionWriterColumnarToImgt(HlaCollectionWriterStrategy):
+    """Writes HlaColumnarCollections from their arrays: every allele is its
+    name and the exon sequences sliced from the sequences buffer, handed to
+    `parse_exons_into` of the writer parser, without building the Hla and
+    HlaExon objects. Other collections are written as
+    HlaCollectionWriterBufferedToImgt does, both in the given order.
+    """
+
+    BUFFER_PIECES = HlaCollectionWriterBufferedToImgt.BUFFER_PIECES
+
+    @classmethod
+    def write_hla_collection(cls, file: TextIOWrapper, hla_collection: HlaCollection, parser: HlaStrParser) -> str:
+        if not isinstance(hla_collection, HlaColumnarCollection):
+            HlaCollectionWriterBufferedToImgt.write_hla_collection(file, hla_collection, parser)
+            return
+
+        pieces = List[str]()
+        exons_max_len = hla_collection.exons_max_len
+        qt_exons = hla_collection.qt_exons
+
+        for index, name in enumerate(hla_collection.names):
+            parser.parse_exons_into(
+                name,
+                hla_collection.exon_seqs(index, qt_exons),
+                pieces,
+                exons_max_len=exons_max_len,
+                qt_exons=qt_exons
+            )
+
+            if len(pieces) >= cls.BUFFER_PIECES:
+                file.writelines(pieces)
+                pieces.clear()
+
+        file.writelines(pieces)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import Iterable, Union
+
+from hla import HlaCollection, HlaCollections, HlaReader, HlaWriter
+from super_collections import Dict, List
+
+
+class HlaTwoPassWriter:
+    """Writes the imgt output keeping only per locus data in memory.
+
+    The first pass streams the dat file computing the exons max lengths of
+    every locus, the only data the writer needs up front. The second pass
+    streams it again and writes every allele as soon as it is parsed, to a
+    shard file per locus, which are then concatenated. Without a shards
+    directory the shards are temporary and joined in the order of the
+    writer strategy, otherwise they are kept and joined sorted by locus.
+    """
+
+    def __init__(self, reader: HlaReader, writer: HlaWriter) -> None:
+        self.__reader = reader
+        self.__writer = writer
+
+    def write(self, dat_path: str, imgt_path: Union[str, None] = None,
+              types: Union[Iterable[str], None] = None, use_cds: bool = False,
+              shards_dir: Union[str, None] = None):
+        types = set(types) if types is not None else None
+        hla_collections = self.__scan_exons_max_len(dat_path, types)
+
+        if shards_dir:
+            os.makedirs(shards_dir, exist_ok=True)
+            shards = self.__write_shards(dat_path, shards_dir, hla_collections, types, use_cds)
+
+            if imgt_path:
+                with self.writer.measure():
+                    HlaWriter.concat_shards(imgt_path, [shards[type] for type in sorted(shards)])
+
+            return
+
+        tmp_parent_dir = os.path.dirname(os.path.abspath(imgt_path))
+
+        with tempfile.TemporaryDirectory(dir=tmp_parent_dir) as tmp_dir:
+            shards = self.__write_shards(dat_path, tmp_dir, hla_collections, types, use_cds)
+
+            with self.writer.measure():
+                HlaWriter.concat_shards(imgt_path, [
+                    shards[hla_collection.type]
+                    for hla_collection in self.writer.strategy.order(hla_collections)
+                ])
+
+    def __scan_exons_max_len(self, dat_path: str, types: Union[set, None]) -> HlaCollections:
+        hla_collections = HlaCollections()
+
+        for hla in self.reader.iter_hlas(dat_path):
+            if types is not None and hla.type not in types:
+                continue
+
+            hla_collections.get_or_create(hla.type).update_exons_max_len(hla)
+
+        return hla_collections
+
+    def __write_shards(self, dat_path: str, shards_dir: str, hla_collections: HlaCollections,
+                       types: Union[set, None], use_cds: bool) -> Dict[str]:
+        shards = Dict[str]()
+        files = Dict()
+        parser = self.writer.parser
+
+        try:
+            with self.writer.measure() as stage:
+                for hla_collection in hla_collections:
+                    shard = HlaWriter.shard_path(shards_dir, hla_collection.type)
+                    shards[hla_collection.type] = shard
+                    files[hla_collection.type] = open(shard, 'w')
+
+                for hla in self.reader.iter_hlas(dat_path):
+                    if types is not None and hla.type not in types:
+                        continue
+
+                    if use_cds:
+                        hla.config_exons_ranges_for_cds()
+
+                    hla_collection: HlaCollection = hla_collections.get(hla.type)
+                    pieces = List[str]()
+
+                    parser.parse_into(
+                        hla,
+                        pieces,
+                        exons_max_len=hla_collection.exons_max_len,
+                        qt_exons=hla_collection.qt_exons
+                    )
+
+                    files[hla.type].writelines(pieces)
+
+                    if stage:
+                        stage.records += 1
+                        stage.bytes += sum(len(piece) for piece in pieces)
+        finally:
+            for file in files.values():
+                file.close()
+
+        return shards
+
+    @property
+    def reader(self) -> HlaReader:
+        return self.__reader
+
+    @property
+    def writer(self) -> HlaWriter:
+        return self.__writer
@@ -1,34 +1,49 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
 from cli import Cli
 from hla import HlaReader, HlaStrParser, HlaWriter, StrHlaParser
+from hla_batch import HlaBatchOutput, HlaBatchWriter
+from hla_cache import HlaCache
+from hla_cds import HlaCdsView
+from hla_incremental import HlaIncrementalWriter
+from hla_merge import HlaFastaMerger, HlaImgtMerger
+from hla_metrics import HlaMetrics
+from hla_two_pass import HlaTwoPassWriter
 
 from hla_strategy.parser \
     import (HlaStrParserAsImgt, HlaStrParserAsImgtNotEmptyExon,
-            StrHlaParserFromDat, StrHlaParserFromFasta, StrHlaParserFromImgt)
+            StrHlaParserFromDat, StrHlaParserLazyFromDat, StrHlaParserSinglePassFromDat)
 
 from hla_strategy.reader \
-    import (HlaContentReaderFromDat, HlaContentReaderFromFasta,
-            HlaContentReaderFromImgt, HlaContentReaderQuickFromDat)
+    import (HlaContentReaderBufferedFromDat, HlaContentReaderFromDat,
+            HlaContentReaderMmapFromDat, HlaContentReaderQuickFromDat)
 
-from hla_strategy.writer import HlaCollectionWriterToImgt
-from super_collections import List
+from hla_strategy.writer import HlaCollectionWriterBufferedToImgt, HlaCollectionWriterToImgt
 
 
 reader_strategies = {
     'default': HlaContentReaderFromDat,
-    'quick': HlaContentReaderQuickFromDat
+    'quick': HlaContentReaderQuickFromDat,
+    'buffered': HlaContentReaderBufferedFromDat,
+    'mmap': HlaContentReaderMmapFromDat
 }
 writer_strategies = {
-    'default': HlaCollectionWriterToImgt
+    'default': HlaCollectionWriterToImgt,
+    'buffered': HlaCollectionWriterBufferedToImgt
 }
 reader_parser_strategies = {
-    'default': StrHlaParserFromDat
+    'default': StrHlaParserFromDat,
+    'single_pass': StrHlaParserSinglePassFromDat,
+    'lazy': StrHlaParserLazyFromDat
 }
 writer_parser_strategies = {
     'default': HlaStrParserAsImgt,
     'remove_empty_exon': HlaStrParserAsImgtNotEmptyExon
 }
 
-hlascan_types = List[str](['HLA-A', 'HLA-B', 'HLA-C', 'HLA-E', 'HLA-F', 'HLA-G',
+hlascan_types = frozenset(['HLA-A', 'HLA-B', 'HLA-C', 'HLA-E', 'HLA-F', 'HLA-G',
                            'MICA', 'MICB', 'HLA-DMA', 'HLA-DMB', 'HLA-DOA',
                            'HLA-DOB', 'HLA-DPA1', 'HLA-DPB1', 'HLA-DQA1', 'HLA-DQB1',
                            'HLA-DRA', 'HLA-DRB1', 'HLA-DRB5', 'TAP1', 'TAP2'
@@ -40,10 +55,23 @@ def main():
 
     dat_file = args.dat_file
     imgt_file = args.imgt_file
+    shards_dir = args.shards_dir
     fasta_file = args.fasta_file
     from_imgt_file = args.from_imgt_file
+    batch_file = args.batch_file
+    loci = args.loci
     normalize = args.normalize
     use_cds = args.use_cds
+    no_cache = args.no_cache
+    cache_dir = args.cache_dir or HlaCache.default_dir()
+    cache_size = args.cache_size
+    incremental = args.incremental
+    low_memory = args.low_memory
+    profile = args.profile
+    metrics_json = args.metrics_json
+    profile_dump = args.profile_dump
+    use_index = args.use_index
+    workers = args.workers
     reader_strategy = args.reader_strategy
     writer_strategy = args.writer_strategy
     reader_parser_strategy = args.reader_parser_strategy
@@ -65,6 +93,24 @@ def main():
         writer_strategy
     )
 
+    if loci is not None:
+        loci = frozenset(locus.strip() for locus in loci.split(',') if locus.strip())
+    else:
+        loci = hlascan_types
+
+    if not loci:
+        print('Invalid loci')
+        exit(1)
+
+    if not imgt_file and not shards_dir and not batch_file:
+        print('One of --imgt, --shards or --batch is required')
+        exit(1)
+
+    if batch_file and (imgt_file or shards_dir or incremental or low_memory):
+        print('Batch mode does not support --imgt, --shards, --incremental '
+              'and --low-memory')
+        exit(1)
+
     if not reader_parser_strategy:
         print('Invalid reader parser strategy')
         exit(1)
@@ -81,62 +127,176 @@ def main():
         print('Invalid writer strategy')
         exit(1)
 
+    if workers < 1:
+        print('Invalid number of workers')
+        exit(1)
+
+    if low_memory and (fasta_file or from_imgt_file):
+        print('Low memory mode does not support --fasta and --from-imgt')
+        exit(1)
+
+    if incremental and (not shards_dir or low_memory or fasta_file or from_imgt_file):
+        print('Incremental mode requires --shards and does not support '
+              '--low-memory, --fasta and --from-imgt')
+        exit(1)
+
+    if batch_file:
+        outputs = batch_outputs(
+            batch_file, use_cds, args.writer_strategy, args.writer_parser_strategy
+        )
+
+        if not outputs:
+            print('Invalid batch')
+            exit(1)
+
     reader_parser = StrHlaParser(reader_parser_strategy)
     writer_parser = HlaStrParser(writer_parser_strategy)
 
-    reader = HlaReader(reader_strategy, reader_parser)
-    writer = HlaWriter(writer_strategy, writer_parser)
+    metrics = HlaMetrics(bool(profile_dump)) if profile or metrics_json or profile_dump else None
+    measure = metrics.stage if metrics is not None else lambda name: nullcontext()
+
+    reader = HlaReader(reader_strategy, reader_parser, workers, loci, metrics=metrics)
+    writer = HlaWriter(writer_strategy, writer_parser, metrics)
+
+    if incremental:
+        report = HlaIncrementalWriter(reader, writer).write(
+            dat_file, shards_dir, imgt_file, types=loci, use_cds=use_cds
+        )
+        print(report)
+    elif low_memory:
+        HlaTwoPassWriter(reader, writer).write(
+            dat_file, imgt_file, types=loci, use_cds=use_cds,
+            shards_dir=shards_dir
+        )
+    else:
+        types = loci if use_index else None
+        mergers = []
+
+        if fasta_file:
+            mergers.append(('fasta_merge', HlaFastaMerger(fasta_file)))
+
+        if from_imgt_file:
+            mergers.append(('imgt_merge', HlaImgtMerger(from_imgt_file, workers)))
+
+        with ThreadPoolExecutor(max(len(mergers), 1)) as executor:
+            prepares = [executor.submit(merger.prepare) for __, merger in mergers]
+
+            if no_cache or reader_parser_strategy is StrHlaParserLazyFromDat:
+                hla_collections = reader.read(dat_file, types)
+            else:
+                cache = HlaCache(cache_dir, cache_size * 2 ** 20)
+
+                with measure('cache'):
+                    hla_collections = cache.read(reader, dat_file, types)
+
+            loads = [
+                executor.submit(load_merge, merger, prepare, hla_collections)
+                for (__, merger), prepare in zip(mergers, prepares)
+            ]
+
+            if batch_file:
+                loaded = {}
+
+                for (stage_name, merger), load in zip(mergers, loads):
+                    with measure(stage_name):
+                        loaded[stage_name] = load.result()
+            else:
+                cds_views = None
+
+                if use_cds:
+                    with measure('cds') as stage:
+                        cds_views = HlaCdsView.of(hla_collections)
+
+                        if stage:
+                            stage.records += sum(len(cds_view) for cds_view in cds_views.values())
+
+                for (stage_name, merger), load in zip(mergers, loads):
+                    with measure(stage_name) as stage:
+                        if isinstance(merger, HlaFastaMerger):
+                            merged = merger.apply(load.result(), cds_views)
+                        else:
+                            merged = merger.apply(load.result())
+
+                        if stage:
+                            stage.records += merged
 
-    hla_collections = reader.read(dat_file)
+        if batch_file:
+            batch_writer = HlaBatchWriter(
+                hla_collections, loaded.get('fasta_merge', ()), loaded.get('imgt_merge', ())
+            )
 
-    if use_cds:
-        for hc in hla_collections:
-            hc.config_exons_ranges_for_cds()
+            with measure('write') as stage:
+                written = batch_writer.write(outputs)
 
-    if fasta_file:
-        reader = HlaReader(HlaContentReaderFromFasta, StrHlaParserFromFasta)
-        fas_hla_collections = reader.read(fasta_file)
+                if stage:
+                    stage.records += sum(written)
+        elif shards_dir:
+            writer.write_shards(shards_dir, hla_collections, imgt_file)
+        else:
+            writer.write(imgt_file, hla_collections)
 
-        fas_hla_collections = fas_hla_collections.to_dict(lambda hc: hc.type)
+    if metrics is not None:
+        report_metrics(metrics, profile, metrics_json, profile_dump)
 
-        for hc in hla_collections:
-            imgt_hc = fas_hla_collections.get(hc.type)
 
-            if not imgt_hc:
-                continue
+def batch_outputs(path: str, use_cds: bool, writer_strategy: str, writer_parser_strategy: str) -> list:
+    """Reads a batch file, a json list of outputs, each one with `imgt`
+    and/or `shards` and, optionally, `writer_strategy`,
+    `writer_parser_strategy`, `use_cds`, `fasta` and `from_imgt`. Missing
+    options take the value given on the command line. Returns an empty list
+    when the file is not valid.
+    """
 
-            for hla in hc.hlas.values():
-                imgt_hla = imgt_hc.hlas.get(hla.id)
+    try:
+        with open(path, 'r') as file:
+            jobs = json.load(file)
+    except (OSError, ValueError):
+        return []
+
+    if not isinstance(jobs, list):
+        return []
+
+    outputs = []
+
+    for job in jobs:
+        if not isinstance(job, dict) or not (job.get('imgt') or job.get('shards')):
+            return []
+
+        output = HlaBatchOutput(
+            job.get('imgt'),
+            job.get('shards'),
+            writer_strategies.get(job.get('writer_strategy', writer_strategy)),
+            writer_parser_strategies.get(job.get('writer_parser_strategy', writer_parser_strategy)),
+            bool(job.get('use_cds', use_cds)),
+            bool(job.get('fasta', True)),
+            bool(job.get('from_imgt', True))
+        )
 
-                if not imgt_hla:
-                    continue
+        if not output.writer_strategy or not output.writer_parser_strategy:
+            return []
 
-                for exon in hla.exons:
-                    exon.seq = imgt_hla.seq
+        outputs.append(output)
 
-    if from_imgt_file:
-        reader = HlaReader(HlaContentReaderFromImgt, StrHlaParserFromImgt)
-        imgt_hla_collections = reader.read(from_imgt_file)
+    return outputs
 
-        imgt_hla_collections = imgt_hla_collections.to_dict(lambda hc: hc.type)
 
-        for hc in hla_collections:
-            imgt_hc = imgt_hla_collections.get(hc.type)
+def load_merge(merger, prepare, hla_collections):
+    prepare.result()
+    return merger.load(hla_collections)
 
-            if not imgt_hc:
-                continue
 
-            for hla in hc.hlas.copy().values():
-                imgt_hla = imgt_hc.hlas.get(hla.name)
+def report_metrics(metrics: HlaMetrics, profile: bool, metrics_json: str, profile_dump: str):
+    if profile:
+        print(metrics.report())
 
-                if not imgt_hla:
-                    continue
+    if metrics_json:
+        metrics.save_json(metrics_json)
 
-                hc.hlas[hla.id] = imgt_hla
+    if profile_dump:
+        stage = metrics.dump_profile(profile_dump)
 
-    writer.write(imgt_file, hla_collections.filter(
-        lambda hc, __, ___: hlascan_types.contains(hc.type)
-    ))
+        if stage:
+            print(f'Profile of the {stage.name} stage saved to {profile_dump}')
 
 
 if __name__ == '__main__':
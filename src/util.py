@@ -1,3 +1,9 @@
-def break_in_lines(text: str, line_len: int) -> str:
-    lines = [text[i:i + line_len] for i in range(0, len(text), line_len)]
-    return '\n'.join(lines)
+def wrap_lines(text: str, line_len: int, pieces: list):
+    if len(text) <= line_len:
+        pieces.append(text)
+        pieces.append('\n')
+        return
+
+    for i in range(0, len(text), line_len):
+        pieces.append(text[i:i + line_len])
+        pieces.append('\n')
@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from conftest import SRC_DIR
+
+from benchmark.generate import generate
+from hla import Hla, HlaExon
+from super_collections import List
+
+OUTPUTS = [
+    ({'use_cds': True}, ['--use-cds']),
+    ({'writer_parser_strategy': 'remove_empty_exon'}, ['--writer-parser-strategy', 'remove_empty_exon']),
+    ({'use_cds': True, 'from_imgt': False}, ['--use-cds', '--no-from-imgt']),
+    ({'fasta': False, 'from_imgt': False}, ['--no-fasta', '--no-from-imgt'])
+]
+
+
+@pytest.fixture(scope='module')
+def paths(tmp_path_factory):
+    return generate(str(tmp_path_factory.mktemp('data')), qt_hlas=600, seq_len=600)
+
+
+def run(paths: dict, *args: str):
+    subprocess.run(
+        [sys.executable, 'main.py', '--no-cache', '--dat', paths['dat'], *args],
+        cwd=SRC_DIR, env={**os.environ, 'PYTHONHASHSEED': '0'}, check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def single_run_args(paths: dict, args: list) -> list:
+    inputs = List[str]()
+
+    if '--no-fasta' not in args:
+        inputs.extend(['--fasta', paths['fasta']])
+
+    if '--no-from-imgt' not in args:
+        inputs.extend(['--from-imgt', paths['imgt']])
+
+    return inputs + [arg for arg in args if not arg.startswith('--no-')]
+
+
+def test_batch_matches_single_runs(paths, tmp_path):
+    expected = List[bytes]()
+
+    for i, (__, args) in enumerate(OUTPUTS):
+        imgt_file = str(tmp_path / f'single_{i}.imgt')
+        run(paths, '--imgt', imgt_file, *single_run_args(paths, args))
+
+        with open(imgt_file, 'rb') as file:
+            expected.append(file.read())
+
+    batch_file = str(tmp_path / 'batch.json')
+
+    with open(batch_file, 'w') as file:
+        json.dump([
+            {'imgt': str(tmp_path / f'batch_{i}.imgt'), **output}
+            for i, (output, __) in enumerate(OUTPUTS)
+        ], file)
+
+    for __ in range(5):
+        run(paths, '--fasta', paths['fasta'], '--from-imgt', paths['imgt'], '--batch', batch_file)
+
+        for i in range(len(OUTPUTS)):
+            with open(tmp_path / f'batch_{i}.imgt', 'rb') as file:
+                assert file.read() == expected[i], f'output {i} differs from its single run'
+
+
+def test_exons_by_number_from_threads():
+    qt_threads = 4
+    qt_exons = 50
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    try:
+        for __ in range(300):
+            exons = List[HlaExon]()
+
+            for number in range(1, qt_exons + 1):
+                exon = HlaExon(range(number * 10, number * 10 + 5))
+                exon.number = number
+                exons.append(exon)
+
+            hla = Hla('HLA00001', 'HLA-A*01:01:01', 'a' * qt_exons * 10, exons)
+            barrier = threading.Barrier(qt_threads)
+            missing = List[int]()
+
+            def look_up():
+                barrier.wait()
+
+                for number in range(1, qt_exons + 1):
+                    if hla.find_exon_by_number(number) is None:
+                        missing.append(number)
+
+            threads = [threading.Thread(target=look_up) for __ in range(qt_threads)]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+            assert not missing
+    finally:
+        sys.setswitchinterval(switch_interval)
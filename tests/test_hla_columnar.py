@@ -0,0 +1,64 @@
+from benchmark.generate import generate
+from hla import HlaExon, HlaReader, HlaStrParser, HlaWriter, StrHlaParser
+from hla_columnar import HlaColumnarCollection
+from hla_strategy.parser import HlaStrParserAsImgt, HlaStrParserAsImgtNotEmptyExon, StrHlaParserFromDat
+from hla_strategy.reader import HlaContentReaderFromDat
+from hla_strategy.writer import HlaCollectionWriterColumnarToImgt, HlaCollectionWriterToImgt
+from super_collections import List
+
+
+def read_collections(tmp_path) -> List:
+    paths = generate(str(tmp_path), qt_hlas=300, seq_len=600)
+    reader = HlaReader(HlaContentReaderFromDat, StrHlaParser(StrHlaParserFromDat))
+
+    return List(reader.read(paths['dat']))
+
+
+def test_exons_max_len_matches_collection(tmp_path):
+    for hla_collection in read_collections(tmp_path):
+        columnar = HlaColumnarCollection(hla_collection.type)
+
+        for hla in hla_collection.hlas.values():
+            columnar.add(hla)
+
+        assert columnar.exons_max_len == hla_collection.exons_max_len
+
+
+def test_columnar_writer_matches_object_writer(tmp_path):
+    hla_collections = read_collections(tmp_path)
+    hla = next(iter(hla_collections[0].hlas.values()))
+
+    # An exon sequence that is not a slice of its allele sequence.
+    hla.exons[0].seq = 'g' * (hla.exons[0].len + 5)
+    columnar = List(HlaColumnarCollection.from_collection(c) for c in hla_collections)
+
+    for parser_strategy in (HlaStrParserAsImgt, HlaStrParserAsImgtNotEmptyExon):
+        expected = tmp_path / 'expected.imgt'
+        written = tmp_path / 'columnar.imgt'
+
+        HlaWriter(HlaCollectionWriterToImgt, HlaStrParser(parser_strategy)).write(
+            str(expected), hla_collections
+        )
+        HlaWriter(HlaCollectionWriterColumnarToImgt, HlaStrParser(parser_strategy)).write(
+            str(written), columnar
+        )
+
+        assert written.read_text() == expected.read_text()
+
+
+def test_columnar_keeps_allele_sequences(tmp_path):
+    hla_collection = read_collections(tmp_path)[0]
+
+    for hla in hla_collection.hlas.values():
+        exon: HlaExon = hla.exons[0] if hla.exons else None
+
+        if exon is not None:
+            exon.seq = 'g' * (exon.len + 3)
+
+    columnar = HlaColumnarCollection.from_collection(hla_collection)
+
+    for hla in hla_collection.hlas.values():
+        columnar_hla = columnar.hlas[hla.id]
+
+        assert columnar_hla.seq == hla.seq
+        assert [exon.seq for exon in columnar_hla.exons] == [exon.seq for exon in hla.exons]